@@ -54,6 +54,8 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # Must be after SecurityMiddleware
+    # Outermost of the database users, so session/auth queries are counted too
+    'request_metrics.RequestMetricsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -106,6 +108,36 @@ EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER', '')
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD', '')
 DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', EMAIL_HOST_USER)
 
+# Seconds to collect seat-freeing events (dropped enrollments, raised openings) before one
+# background waitlist pass per course; 0 promotes synchronously right after commit
+WAITLIST_PROCESSING_DELAY = float(os.getenv('WAITLIST_PROCESSING_DELAY', 2.0))
+
+# Shared cache - also records profile changes that invalidate role claims in JWTs and
+# sessions. Role claims are only trusted with a cache shared by all workers (e.g. Redis);
+# with the per-process default every request looks its role up in the database
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+# Activity/notification logs are queued in-process and written to MongoDB in batches by a
+# background thread. OVERFLOW_POLICY applies when the queue is full: drop, block or spill.
+# Batches that can't reach MongoDB are spooled to SPOOL_DIR and replayed after reconnecting
+ACTIVITY_LOG_BUFFER = {
+    'ENABLED': os.getenv('ACTIVITY_LOG_BUFFER_ENABLED', 'True') == 'True',
+    'MAX_QUEUE_SIZE': int(os.getenv('ACTIVITY_LOG_MAX_QUEUE_SIZE', 10000)),
+    'BATCH_SIZE': int(os.getenv('ACTIVITY_LOG_BATCH_SIZE', 200)),
+    'FLUSH_INTERVAL_MS': int(os.getenv('ACTIVITY_LOG_FLUSH_INTERVAL_MS', 500)),
+    'OVERFLOW_POLICY': os.getenv('ACTIVITY_LOG_OVERFLOW_POLICY', 'drop'),
+    'BLOCK_TIMEOUT_MS': int(os.getenv('ACTIVITY_LOG_BLOCK_TIMEOUT_MS', 100)),
+    'SPOOL_DIR': os.getenv('ACTIVITY_LOG_SPOOL_DIR', str(BASE_DIR / 'activity_spool')),
+    'SPOOL_MAX_FILE_BYTES': int(os.getenv('ACTIVITY_LOG_SPOOL_MAX_FILE_BYTES', 10 * 1024 * 1024)),
+    'SPOOL_MAX_FILES': int(os.getenv('ACTIVITY_LOG_SPOOL_MAX_FILES', 50)),
+    'RECONNECT_INTERVAL_SECONDS': float(os.getenv('MONGODB_RECONNECT_INTERVAL', 30)),
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -161,7 +193,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'students.jwt_authentication.RoleClaimsJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
@@ -169,6 +201,25 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Keyset pagination for the JSON list endpoints (?limit=&cursor=)
+API_PAGE_SIZE = int(os.getenv('API_PAGE_SIZE', 50))
+API_MAX_PAGE_SIZE = int(os.getenv('API_MAX_PAGE_SIZE', 200))
+
+# How long a teacher's course-id set is cached for permission checks. Assignment changes
+# clear it on commit; it is only cached when the default cache is shared by all workers
+TEACHER_COURSES_CACHE_SECONDS = int(os.getenv('TEACHER_COURSES_CACHE_SECONDS', 60))
+
+# Per-request SQL/MongoDB/view timing (request_metrics.RequestMetricsMiddleware). Totals are
+# sent as a Server-Timing header; requests over a threshold are logged as JSON warnings
+REQUEST_METRICS = {
+    'ENABLED': os.getenv('REQUEST_METRICS_ENABLED', 'True') == 'True',
+    'SERVER_TIMING': os.getenv('REQUEST_METRICS_SERVER_TIMING', 'True') == 'True',
+    'QUERY_COUNT_THRESHOLD': int(os.getenv('REQUEST_METRICS_QUERY_COUNT_THRESHOLD', 20)),
+    'REPEATED_QUERY_THRESHOLD': int(os.getenv('REQUEST_METRICS_REPEATED_QUERY_THRESHOLD', 5)),
+    'SLOW_REQUEST_MS': int(os.getenv('REQUEST_METRICS_SLOW_REQUEST_MS', 500)),
+    'LOG_ALL_REQUESTS': os.getenv('REQUEST_METRICS_LOG_ALL_REQUESTS', 'False') == 'True',
+}
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(hours=1),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
@@ -191,18 +242,32 @@ LOGGING = {
             'format': '{levelname} {message}',
             'style': '{',
         },
+        # request_metrics messages are already JSON
+        'structured': {
+            'format': '{message}',
+            'style': '{',
+        },
     },
     'handlers': {
         'console': {
             'class': 'logging.StreamHandler',
             'formatter': 'verbose',
         },
+        'structured_console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'structured',
+        },
     },
     'root': {
         'handlers': ['console'],
         'level': 'INFO',
     },
     'loggers': {
+        'request_metrics': {
+            'handlers': ['structured_console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
         'students': {
             'handlers': ['console'],
             'level': 'INFO',
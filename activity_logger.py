@@ -1,7 +1,225 @@
 # Activity Logger Service for MongoDB
 from datetime import datetime, timezone, timedelta
 from mongo_config import mongo_connection
-from typing import Optional, Dict, Any, List
+from activity_spool import ActivitySpool
+from typing import Optional, Dict, Any, List, Callable
+import atexit
+import queue
+import threading
+import time
+
+
+class BufferedActivityWriter:
+    """
+    Bounded in-process queue of log documents drained by a background thread
+
+    The thread writes with insert_many(ordered=False) every batch_size documents or
+    flush_interval_ms milliseconds, whichever comes first. Batches that can't reach
+    MongoDB go to the spool (if any) and are replayed later. When the queue is full the
+    overflow policy decides what happens to new documents:
+        drop  - discard them (counted in stats['dropped'])
+        block - wait up to block_timeout_ms for room, then drop
+        spill - append them to the spool
+    """
+
+    OVERFLOW_POLICIES = ('drop', 'block', 'spill')
+
+    def __init__(self, collection_name: str, max_queue_size: int = 10000, batch_size: int = 200,
+                 flush_interval_ms: int = 500, overflow_policy: str = 'drop', block_timeout_ms: int = 100,
+                 spool: Optional[ActivitySpool] = None, get_collection: Optional[Callable] = None):
+        if overflow_policy not in self.OVERFLOW_POLICIES:
+            raise ValueError(f"overflow_policy must be one of {self.OVERFLOW_POLICIES}")
+
+        self.collection_name = collection_name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.overflow_policy = overflow_policy
+        self.block_timeout = block_timeout_ms / 1000
+        self.spool = spool
+        self._get_collection = get_collection or self._mongo_collection
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._stats = {"enqueued": 0, "flushed": 0, "dropped": 0, "spilled": 0, "failed": 0}
+        self._stats_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _mongo_collection(self):
+        if not mongo_connection.is_connected:
+            return None
+        return mongo_connection.db[self.collection_name]
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        with self._stats_lock:
+            return {**self._stats, "queued": self._queue.qsize()}
+
+    def _count(self, key: str, amount: int = 1):
+        with self._stats_lock:
+            self._stats[key] += amount
+
+    def write(self, document: Dict[str, Any]) -> bool:
+        """Queue a document without touching the network; False if it was dropped"""
+        self._ensure_started()
+        try:
+            if self.overflow_policy == 'block':
+                self._queue.put(document, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(document)
+        except queue.Full:
+            if self.overflow_policy == 'spill' and self._spill([document]):
+                return True
+            self._count("dropped")
+            return False
+
+        self._count("enqueued")
+        return True
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(
+                    target=self._run, name=f"activity-writer-{self.collection_name}", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._next_batch()
+            if batch:
+                self._write_batch(batch)
+
+    def _next_batch(self) -> List[Dict[str, Any]]:
+        """Collect up to batch_size documents, waiting at most flush_interval for stragglers"""
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size and not self._stop.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write_batch(self, batch: List[Dict[str, Any]]):
+        with self._flush_lock:
+            try:
+                collection = self._get_collection()
+                if collection is None:
+                    raise ConnectionError("MongoDB is not connected")
+                collection.insert_many(batch, ordered=False)
+                self._count("flushed", len(batch))
+            except Exception as e:
+                if self._spill(batch):
+                    return
+                print(f"Error writing {len(batch)} activity log(s): {e}")
+                self._count("failed", len(batch))
+
+    def _spill(self, documents: List[Dict[str, Any]]) -> bool:
+        if self.spool is None or not self.spool.append(self.collection_name, documents):
+            return False
+        self._count("spilled", len(documents))
+        return True
+
+    def flush(self):
+        """Write everything queued so far from the calling thread"""
+        while True:
+            batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return
+            self._write_batch(batch)
+
+    def close(self, timeout: float = 5.0):
+        """Stop the background thread and flush what is left (called at worker shutdown)"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+
+
+_writers: Dict[str, BufferedActivityWriter] = {}
+_writers_lock = threading.Lock()
+_spool: Optional[ActivitySpool] = None
+
+
+def _buffer_settings() -> Dict[str, Any]:
+    from django.conf import settings
+    return getattr(settings, 'ACTIVITY_LOG_BUFFER', {})
+
+
+def _reconnected_db():
+    return mongo_connection.db if mongo_connection.reconnect() else None
+
+
+def get_activity_spool() -> Optional[ActivitySpool]:
+    """Process-wide disk spool, with its reconnect/replay loop started on first use"""
+    global _spool
+    if _spool is None:
+        with _writers_lock:
+            config = _buffer_settings()
+            if _spool is None and config.get('SPOOL_DIR'):
+                _spool = ActivitySpool(
+                    config['SPOOL_DIR'],
+                    max_file_bytes=config.get('SPOOL_MAX_FILE_BYTES', 10 * 1024 * 1024),
+                    max_files=config.get('SPOOL_MAX_FILES', 50),
+                )
+                _spool.start_replay(_reconnected_db, config.get('RECONNECT_INTERVAL_SECONDS', 30))
+    return _spool
+
+
+def get_activity_writer(collection_name: str) -> BufferedActivityWriter:
+    """Process-wide buffered writer for a log collection, configured from ACTIVITY_LOG_BUFFER"""
+    writer = _writers.get(collection_name)
+    if writer is not None:
+        return writer
+
+    spool = get_activity_spool()
+    with _writers_lock:
+        if collection_name not in _writers:
+            config = _buffer_settings()
+            _writers[collection_name] = BufferedActivityWriter(
+                collection_name,
+                max_queue_size=config.get('MAX_QUEUE_SIZE', 10000),
+                batch_size=config.get('BATCH_SIZE', 200),
+                flush_interval_ms=config.get('FLUSH_INTERVAL_MS', 500),
+                overflow_policy=config.get('OVERFLOW_POLICY', 'drop'),
+                block_timeout_ms=config.get('BLOCK_TIMEOUT_MS', 100),
+                spool=spool,
+            )
+        return _writers[collection_name]
+
+
+@atexit.register
+def flush_activity_writers():
+    """Flush every buffered writer - runs when a gunicorn worker or manage.py command exits"""
+    for writer in list(_writers.values()):
+        writer.close()
+    if _spool is not None:
+        _spool.stop()
+
+
+def _write_log(collection_name: str, document: Dict[str, Any]) -> bool:
+    """Buffer the document, or insert it directly (spooling it if MongoDB is down) when buffering is disabled"""
+    if _buffer_settings().get('ENABLED', True):
+        return get_activity_writer(collection_name).write(document)
+
+    db = mongo_connection.get_db(wait=False)
+    if db is None:
+        spool = get_activity_spool()
+        return spool is not None and spool.append(collection_name, [document])
+    db[collection_name].insert_one(document)
+    return True
 
 
 class ActivityLogger:
@@ -32,35 +250,63 @@ class ActivityLogger:
         Returns:
             True if logged successfully, False otherwise
         """
-        if not mongo_connection.is_connected:
-            return False
-
         try:
-            db = mongo_connection.db
-            
-            activity_log = {
-                "action_type": action_type,
-                "user_id": user_id,
-                "user_type": user_type,
-                "username": username,
-                "details": details or {},
-                "ip_address": ip_address,
-                "user_agent": user_agent,
-                "timestamp": datetime.now(timezone.utc)
-            }
+            activity_log = ActivityLogger._build_activity(
+                action_type, user_id, user_type, username, details, ip_address, user_agent
+            )
             
-            db.activity_logs.insert_one(activity_log)
-            return True
+            return _write_log("activity_logs", activity_log)
             
         except Exception as e:
             print(f"Error logging activity: {e}")
             return False
 
+    @staticmethod
+    def _build_activity(action_type: str, user_id: Optional[int] = None, user_type: Optional[str] = None,
+                        username: Optional[str] = None, details: Optional[Dict[str, Any]] = None,
+                        ip_address: Optional[str] = None, user_agent: Optional[str] = None) -> Dict[str, Any]:
+        """Build an activity log document"""
+        return {
+            "action_type": action_type,
+            "user_id": user_id,
+            "user_type": user_type,
+            "username": username,
+            "details": details or {},
+            "ip_address": ip_address,
+            "user_agent": user_agent,
+            "timestamp": datetime.now(timezone.utc)
+        }
+
+    @staticmethod
+    def log_activities(activities: List[Dict[str, Any]]) -> bool:
+        """
+        Log several activities; the buffered writer sends them in one insert_many
+
+        Args:
+            activities: Keyword arguments for log_activity, one dict per activity
+
+        Returns:
+            True if logged successfully, False otherwise
+        """
+        if not activities:
+            return False
+
+        try:
+            results = [
+                _write_log("activity_logs", ActivityLogger._build_activity(**activity))
+                for activity in activities
+            ]
+            return all(results)
+
+        except Exception as e:
+            print(f"Error logging activities: {e}")
+            return False
+
     @staticmethod
     def log_login(user, success: bool = True, ip_address: Optional[str] = None, 
                   user_agent: Optional[str] = None) -> bool:
         """Log user login attempt"""
-        from templates.template_views import get_user_type
+        from user_roles import get_user_type
         
         if success:
             user_type = get_user_type(user) if user else None
@@ -85,7 +331,7 @@ class ActivityLogger:
     def log_logout(user, ip_address: Optional[str] = None, 
                    user_agent: Optional[str] = None) -> bool:
         """Log user logout"""
-        from templates.template_views import get_user_type
+        from user_roles import get_user_type
         
         user_type = get_user_type(user) if user else None
         return ActivityLogger.log_activity(
@@ -141,6 +387,24 @@ class ActivityLogger:
     def log_enrollment_request(student, course, action: str, teacher=None, 
                                reason: Optional[str] = None) -> bool:
         """Log enrollment request actions (created, approved, rejected, waitlisted)"""
+        return ActivityLogger.log_activity(
+            **ActivityLogger._enrollment_request_activity(student, course, action, teacher, reason)
+        )
+
+    @staticmethod
+    def log_enrollment_requests(enrollment_requests, action: str, teacher=None,
+                                reason: Optional[str] = None) -> bool:
+        """Log the same action for many enrollment requests in one batch"""
+        return ActivityLogger.log_activities([
+            ActivityLogger._enrollment_request_activity(
+                enrollment_request.student, enrollment_request.course, action, teacher, reason
+            )
+            for enrollment_request in enrollment_requests
+        ])
+
+    @staticmethod
+    def _enrollment_request_activity(student, course, action: str, teacher=None,
+                                     reason: Optional[str] = None) -> Dict[str, Any]:
         details = {
             "student_id": student.id,
             "student_name": f"{student.first_name} {student.last_name}",
@@ -166,13 +430,13 @@ class ActivityLogger:
             user_type = "student"
             username = student.user.username
             
-        return ActivityLogger.log_activity(
-            action_type=f"enrollment_request_{action}",
-            user_id=user_id,
-            user_type=user_type,
-            username=username,
-            details=details
-        )
+        return {
+            "action_type": f"enrollment_request_{action}",
+            "user_id": user_id,
+            "user_type": user_type,
+            "username": username,
+            "details": details
+        }
 
     @staticmethod
     def log_registration(user, profile_type: str) -> bool:
@@ -293,23 +557,27 @@ class ActivityLogger:
                 "total_activities": total_activities,
                 "activities_by_type": activities_by_type,
                 "activities_by_user_type": activities_by_user_type,
-                "period_days": days
+                "period_days": days,
+                "buffer": ActivityLogger.get_buffer_stats()
             }
             
         except Exception as e:
             print(f"Error retrieving activity stats: {e}")
             return {}
 
+    @staticmethod
+    def get_buffer_stats() -> Dict[str, Dict[str, int]]:
+        """Flushed/dropped/spilled counters of each buffered log writer and of the disk spool"""
+        stats = {name: writer.stats for name, writer in _writers.items()}
+        if _spool is not None:
+            stats["spool"] = _spool.stats
+        return stats
+
     @staticmethod
     def log_notification(recipient_email: str, subject: str, message: str, 
                         status: str = "sent", notification_type: str = "email") -> bool:
         """Log notification/email sent"""
-        if not mongo_connection.is_connected:
-            return False
-
         try:
-            db = mongo_connection.db
-            
             notification_log = {
                 "notification_type": notification_type,
                 "recipient_email": recipient_email,
@@ -319,8 +587,7 @@ class ActivityLogger:
                 "created_at": datetime.now(timezone.utc)
             }
             
-            db.notification_logs.insert_one(notification_log)
-            return True
+            return _write_log("notification_logs", notification_log)
             
         except Exception as e:
             print(f"Error logging notification: {e}")
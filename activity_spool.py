@@ -0,0 +1,185 @@
+# Local disk spool for activity logs that could not be written to MongoDB
+from bson import ObjectId, json_util
+from pymongo.errors import BulkWriteError
+from typing import Optional, Dict, Any, List, Callable
+import glob
+import os
+import threading
+import time
+
+# Duplicate key - the document was already inserted by an earlier, partially failed replay
+DUPLICATE_KEY_ERROR = 11000
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+
+class ActivitySpool:
+    """
+    Append-only newline-delimited spool of log documents, one record per line
+
+    Each process appends to its own active-<pid>.jsonl file and seals it once it
+    reaches max_file_bytes; at most max_files sealed files are kept (oldest are
+    dropped first). Records carry their collection name and an _id assigned at
+    spool time, so replaying a file twice never duplicates a log.
+    """
+
+    def __init__(self, directory: str, max_file_bytes: int = 10 * 1024 * 1024, max_files: int = 50,
+                 replay_batch_size: int = 1000):
+        self.directory = directory
+        self.max_file_bytes = max_file_bytes
+        self.max_files = max_files
+        self.replay_batch_size = replay_batch_size
+        self._lock = threading.Lock()
+        self._stats = {"spooled": 0, "replayed": 0, "discarded": 0}
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def active_path(self) -> str:
+        return os.path.join(self.directory, f"active-{os.getpid()}.jsonl")
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self._stats, "backlog_files": len(self._backlog_files())}
+
+    def append(self, collection_name: str, documents: List[Dict[str, Any]]) -> bool:
+        """Spool documents for a collection; False if the disk write failed"""
+        lines = []
+        for document in documents:
+            document.setdefault("_id", ObjectId())
+            lines.append(json_util.dumps({"c": collection_name, "d": document}, separators=(',', ':')))
+
+        try:
+            with self._lock:
+                os.makedirs(self.directory, exist_ok=True)
+                with open(self.active_path, 'a', encoding='utf-8') as spool_file:
+                    spool_file.write('\n'.join(lines) + '\n')
+                    size = spool_file.tell()
+                self._stats["spooled"] += len(lines)
+                if size >= self.max_file_bytes:
+                    self._seal(self.active_path)
+            return True
+        except OSError as e:
+            print(f"Error spooling activity logs to {self.directory}: {e}")
+            return False
+
+    def _seal(self, path: str):
+        """Rename an active file so it can be replayed, then enforce max_files (lock held)"""
+        if not os.path.exists(path):
+            return
+        os.replace(path, os.path.join(self.directory, f"sealed-{time.time_ns()}-{os.getpid()}.jsonl"))
+
+        sealed = self._sealed_files()
+        for old_path in sealed[:max(len(sealed) - self.max_files, 0)]:
+            try:
+                with open(old_path, encoding='utf-8') as old_file:
+                    discarded = sum(1 for _ in old_file)
+                os.remove(old_path)
+                self._stats["discarded"] += discarded
+                print(f"Activity spool full - discarded {discarded} log(s) from {old_path}")
+            except OSError:
+                pass
+
+    def _sealed_files(self) -> List[str]:
+        return sorted(glob.glob(os.path.join(self.directory, "sealed-*.jsonl")))
+
+    def _backlog_files(self) -> List[str]:
+        return glob.glob(os.path.join(self.directory, "*.jsonl"))
+
+    def has_backlog(self) -> bool:
+        return bool(self._backlog_files())
+
+    def replay(self, db) -> int:
+        """Bulk insert every spooled record into db; returns how many were replayed"""
+        with self._lock:
+            self._seal(self.active_path)
+            # Active files of processes that died are never sealed by their owner
+            for path in glob.glob(os.path.join(self.directory, "active-*.jsonl")):
+                pid = int(os.path.basename(path)[len("active-"):-len(".jsonl")])
+                if not _pid_alive(pid):
+                    self._seal(path)
+
+        replayed = 0
+        for path in self._sealed_files():
+            # Claim the file so another worker sharing the directory skips it
+            claimed = f"{path}.replaying-{os.getpid()}"
+            try:
+                os.rename(path, claimed)
+            except OSError:
+                continue
+
+            try:
+                replayed += self._replay_file(db, claimed)
+                os.remove(claimed)
+            except Exception as e:
+                os.replace(claimed, path)
+                print(f"Error replaying activity spool {path}: {e}")
+                break
+
+        with self._lock:
+            self._stats["replayed"] += replayed
+        return replayed
+
+    def _replay_file(self, db, path: str) -> int:
+        batches: Dict[str, List[Dict[str, Any]]] = {}
+        replayed = 0
+        with open(path, encoding='utf-8') as spool_file:
+            for line in spool_file:
+                if not line.strip():
+                    continue
+                record = json_util.loads(line)
+                batch = batches.setdefault(record["c"], [])
+                batch.append(record["d"])
+                if len(batch) >= self.replay_batch_size:
+                    replayed += self._insert(db[record["c"]], batch)
+                    batches[record["c"]] = []
+
+        for collection_name, batch in batches.items():
+            if batch:
+                replayed += self._insert(db[collection_name], batch)
+        return replayed
+
+    @staticmethod
+    def _insert(collection, documents: List[Dict[str, Any]]) -> int:
+        try:
+            collection.insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            if any(error.get("code") != DUPLICATE_KEY_ERROR for error in e.details.get("writeErrors", [])):
+                raise
+        return len(documents)
+
+    def start_replay(self, connect: Callable[[], Optional[Any]], interval: float = 30.0):
+        """
+        Background reconnect loop: whenever there is a backlog, connect() is asked for
+        a database (None while MongoDB is still down) and the spool is replayed into it
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._replay_loop, args=(connect, interval), name="activity-spool-replay", daemon=True
+        )
+        self._thread.start()
+
+    def _replay_loop(self, connect: Callable[[], Optional[Any]], interval: float):
+        while not self._stop.wait(interval):
+            if not self.has_backlog():
+                continue
+            try:
+                db = connect()
+                if db is not None:
+                    self.replay(db)
+            except Exception as e:
+                print(f"Error in activity spool replay: {e}")
+
+    def stop(self):
+        self._stop.set()
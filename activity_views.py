@@ -1,11 +1,12 @@
 # API Views for Activity Logs
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, authentication_classes
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
 from rest_framework import status
 from activity_logger import ActivityLogger
 from django.contrib.auth.decorators import login_required
-from templates.template_views import get_user_type
+from user_roles import get_request_role
+from students.jwt_authentication import CLAIMS_AUTHENTICATION_CLASSES
 
 
 @api_view(['GET'])
@@ -20,7 +21,7 @@ def get_activity_logs(request):
     - user_id: Filter by user ID
     """
     # Check if user is admin or teacher
-    user_type = get_user_type(request.user)
+    user_type = get_request_role(request).user_type
     if user_type not in ['admin', 'teacher']:
         return Response(
             {"error": "Permission denied. Admins and teachers only."},
@@ -69,6 +70,7 @@ def get_activity_stats(request):
 
 
 @api_view(['GET'])
+@authentication_classes(CLAIMS_AUTHENTICATION_CLASSES)
 @permission_classes([IsAuthenticated])
 def get_my_activity_logs(request):
     """
@@ -96,7 +98,7 @@ def activity_logs_view(request):
     from django.shortcuts import render, redirect
     from django.contrib import messages
     
-    user_type = get_user_type(request.user)
+    user_type = get_request_role(request).user_type
     if user_type not in ['admin', 'teacher']:
         messages.error(request, 'Access denied. Admins and teachers only.')
         return redirect('/')
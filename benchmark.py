@@ -0,0 +1,208 @@
+# In-process HTTP benchmarks of the hot REST and template endpoints
+import math
+import statistics
+import time
+from collections import namedtuple
+from datetime import datetime, timezone
+from django.db import connection, transaction
+from django.db.models import Count, F
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from courses.models import Course
+from students.models import Student, Enrollment, EnrollmentRequest
+from teachers.models import Teacher
+
+# data is a JSON body for POSTs; mutating calls are rolled back after every iteration, and
+# prepare() runs untimed inside that transaction to put the data in shape for the call
+Endpoint = namedtuple('Endpoint', ['name', 'method', 'path', 'user', 'data', 'mutates', 'prepare'],
+                      defaults=[None])
+
+ENDPOINT_NAMES = [
+    'course_list', 'student_list', 'pending_requests', 'approve_request',
+    'teacher_dashboard_view', 'student_dashboard_view', 'get_activity_logs',
+]
+
+
+class BenchmarkSetupError(Exception):
+    pass
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def discover_endpoints():
+    """
+    Endpoints with their arguments picked from the current data
+
+    The busiest teacher (most open requests) and the student with the most
+    enrollments are used, so the numbers reflect the heavy end of real traffic.
+    """
+    busiest = (
+        EnrollmentRequest.objects.filter(status__in=['pending', 'waitlisted'], course__teachers__isnull=False)
+        .values('course__teachers').annotate(open_requests=Count('id')).order_by('-open_requests').first()
+    )
+    student = Student.objects.annotate(enrolled=Count('enrollments')).order_by('-enrolled').first()
+    if busiest is None or student is None:
+        raise BenchmarkSetupError('No open requests or students to benchmark - run manage.py seed_data first.')
+
+    teacher = Teacher.objects.select_related('user').get(pk=busiest['course__teachers'])
+    # Seeded courses fill up, so the request may be waitlisted on a full course - open_seat()
+    # frees a seat inside the rolled-back transaction rather than dropping the endpoint
+    to_approve = (
+        EnrollmentRequest.objects.filter(status__in=['pending', 'waitlisted'], course__teachers=teacher)
+        .order_by('id').first()
+    )
+
+    def open_seat():
+        Course.objects.filter(pk=to_approve.course_id, enrolled_count__gte=F('openings')).update(
+            openings=F('enrolled_count') + 1
+        )
+
+    return [
+        Endpoint('course_list', 'GET', '/api/courses/', None, None, False),
+        Endpoint('student_list', 'GET', '/api/students/students/', None, None, False),
+        Endpoint('pending_requests', 'GET', f'/api/teachers/{teacher.pk}/requests/', None, None, False),
+        Endpoint('approve_request', 'POST', f'/api/teachers/request/{to_approve.pk}/approve/',
+                 None, {'teacher_id': teacher.pk}, True, open_seat),
+        Endpoint('teacher_dashboard_view', 'GET', '/teacher-dashboard/', teacher.user, None, False),
+        Endpoint('student_dashboard_view', 'GET', '/student-dashboard/', student.user, None, False),
+        Endpoint('get_activity_logs', 'GET', '/api/activity-logs/', teacher.user, None, False),
+    ]
+
+
+def _request(client, endpoint):
+    if endpoint.method == 'POST':
+        return client.post(endpoint.path, data=endpoint.data, content_type='application/json')
+    return client.get(endpoint.path)
+
+
+def _call(client, endpoint):
+    """One request as (status_code, seconds, query_count)"""
+    if endpoint.mutates:
+        with transaction.atomic():
+            if endpoint.prepare:
+                endpoint.prepare()
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = _request(client, endpoint)
+                elapsed = time.perf_counter() - started
+            transaction.set_rollback(True)
+    else:
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = _request(client, endpoint)
+            elapsed = time.perf_counter() - started
+    # Drain streamed bodies so the timing covers the whole response
+    if response.streaming:
+        b''.join(response.streaming_content)
+    return response.status_code, elapsed, len(queries)
+
+
+def run_endpoint(client, endpoint, iterations, warmup):
+    """Latency percentiles (ms), throughput and query counts for one endpoint"""
+    for _ in range(warmup):
+        _call(client, endpoint)
+
+    latencies = []
+    query_counts = []
+    errors = 0
+    statuses = set()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        status_code, elapsed, query_count = _call(client, endpoint)
+        latencies.append(elapsed * 1000)
+        query_counts.append(query_count)
+        statuses.add(status_code)
+        if status_code >= 400:
+            errors += 1
+    total = time.perf_counter() - started
+
+    return {
+        'method': endpoint.method,
+        'path': endpoint.path,
+        'status_codes': sorted(statuses),
+        'errors': errors,
+        'latency_ms': {
+            'p50': round(percentile(latencies, 50), 3),
+            'p90': round(percentile(latencies, 90), 3),
+            'p99': round(percentile(latencies, 99), 3),
+            'mean': round(statistics.fmean(latencies), 3),
+            'min': round(min(latencies), 3),
+            'max': round(max(latencies), 3),
+        },
+        'throughput_rps': round(iterations / total, 2) if total else None,
+        'queries': {
+            'min': min(query_counts),
+            'median': statistics.median(query_counts),
+            'max': max(query_counts),
+        },
+    }
+
+
+def run_benchmarks(names=None, iterations=50, warmup=5):
+    """Benchmark the selected endpoints (all by default) and return a JSON-ready report"""
+    selected = list(names or ENDPOINT_NAMES)
+    endpoints = [endpoint for endpoint in discover_endpoints() if endpoint.name in selected]
+    clients = {}
+    results = {}
+    for endpoint in endpoints:
+        key = endpoint.user.pk if endpoint.user else None
+        if key not in clients:
+            clients[key] = Client()
+            if endpoint.user:
+                clients[key].force_login(endpoint.user)
+        results[endpoint.name] = run_endpoint(clients[key], endpoint, iterations, warmup)
+
+    return {
+        'meta': {
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'database': connection.vendor,
+            'iterations': iterations,
+            'warmup': warmup,
+            'selected': selected,
+            'dataset': {
+                'students': Student.objects.count(),
+                'courses': Course.objects.count(),
+                'enrollments': Enrollment.objects.count(),
+                'open_requests': EnrollmentRequest.objects.filter(status__in=['pending', 'waitlisted']).count(),
+            },
+        },
+        'endpoints': results,
+        # Selected but not run because the data gave no arguments for them
+        'skipped': [name for name in selected if name not in results],
+    }
+
+
+def compare(report, baseline, tolerance=0.2):
+    """
+    Per-endpoint change against a baseline report
+
+    An endpoint regresses when its p50 grows by more than tolerance (a fraction)
+    or when it runs more queries than before. p90 changes are reported too, but
+    are too noisy over a few dozen requests to fail on. A selected endpoint that
+    the baseline has but this report lacks counts as regressed.
+    """
+    comparison = {}
+    selected = report['meta'].get('selected', ENDPOINT_NAMES)
+    for name in baseline.get('endpoints', {}):
+        if name in selected and name not in report['endpoints']:
+            comparison[name] = {'missing': True, 'regressed': True}
+
+    for name, current in report['endpoints'].items():
+        previous = baseline.get('endpoints', {}).get(name)
+        if previous is None:
+            continue
+
+        entry = {'queries_change': current['queries']['max'] - previous['queries']['max']}
+        regressed = entry['queries_change'] > 0
+        for key in ('p50', 'p90'):
+            before, after = previous['latency_ms'][key], current['latency_ms'][key]
+            change = (after - before) / before if before else 0.0
+            entry[f'{key}_change'] = round(change, 3)
+        regressed = regressed or entry['p50_change'] > tolerance
+        entry['regressed'] = regressed
+        comparison[name] = entry
+    return comparison
@@ -1,6 +1,5 @@
 # Context processors for templates
-from students.models import Student
-from teachers.models import Teacher
+from user_roles import get_request_role
 
 
 def user_type_processor(request):
@@ -15,17 +14,8 @@ def user_type_processor(request):
         if request.user.is_superuser:
             context['is_admin'] = True
         else:
-            try:
-                Student.objects.get(user=request.user)
-                context['is_student'] = True
-            except Student.DoesNotExist:
-                pass
-
-            try:
-                Teacher.objects.get(user=request.user)
-                context['is_teacher'] = True
-            except Teacher.DoesNotExist:
-                pass
+            role = get_request_role(request)
+            context['is_student'] = role.is_student
+            context['is_teacher'] = role.is_teacher
 
     return context
-
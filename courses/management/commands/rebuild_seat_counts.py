@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from courses.models import Course
+
+
+class Command(BaseCommand):
+    help = 'Recount the stored enrolled_count of every course from its enrollments'
+
+    def handle(self, *args, **options):
+        updated = Course.objects.sync_enrolled_counts()
+        self.stdout.write(self.style.SUCCESS(f'Recounted seats for {updated} course(s).'))
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:15
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_enrolled_count(apps, schema_editor):
+    """Count existing enrollments into the new column"""
+    Course = apps.get_model('courses', 'Course')
+    Enrollment = apps.get_model('students', 'Enrollment')
+
+    counts = Enrollment.objects.filter(course=OuterRef('pk')).order_by().values('course').annotate(
+        total=Count('pk')
+    ).values('total')
+    Course.objects.update(enrolled_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0003_course_enrollment_deadline'),
+        ('students', '0007_student_gpa_totals'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='enrolled_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Seats taken, maintained atomically by enrollments'),
+        ),
+        migrations.RunPython(backfill_enrolled_count, migrations.RunPython.noop),
+    ]
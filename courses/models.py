@@ -1,9 +1,32 @@
 
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, Exists, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
 from django.utils import timezone
 from django.core.exceptions import ValidationError
 
 
+class CourseQuerySet(models.QuerySet):
+    def reserve_seats(self, count=1):
+        """Take seats with a guarded UPDATE that only matches courses with room; returns rows updated"""
+        return self.filter(enrolled_count__lte=F('openings') - count).update(
+            enrolled_count=F('enrolled_count') + count
+        )
+
+    def release_seats(self, count=1):
+        """Give seats back, never letting the counter drop below zero"""
+        return self.update(enrolled_count=Greatest(F('enrolled_count') - count, 0))
+
+    def sync_enrolled_counts(self):
+        """Recount enrolled_count from the enrollments table"""
+        from students.models import Enrollment
+
+        counts = Enrollment.objects.filter(course=OuterRef('pk')).order_by().values('course').annotate(
+            total=Count('pk')
+        ).values('total')
+        return self.update(enrolled_count=Coalesce(Subquery(counts), 0))
+
+
 class Course(models.Model):
     name = models.CharField(max_length=100)
     code = models.CharField(max_length=20, unique=True)
@@ -11,16 +34,43 @@ class Course(models.Model):
     credits = models.IntegerField(default=3)
     openings = models.PositiveIntegerField(default=20)
     enrollment_deadline = models.DateTimeField(blank=True, null=True)
+    enrolled_count = models.PositiveIntegerField(default=0, editable=False,
+                                                 help_text="Seats taken, maintained atomically by enrollments")
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = CourseQuerySet.as_manager()
 
-    @property
-    def enrolled_students(self):
-        return self.enrollments.count()
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def save(self, *args, **kwargs):
+        loaded = getattr(self, '_loaded_values', {})
+        credits_changed = 'credits' in loaded and loaded['credits'] != self.credits
+
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            # enrolled_count only changes through F() updates - never write back a stale copy
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'enrolled_count'
+            ]
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if credits_changed:
+                # Every graded student in this course now has a different weighted GPA
+                from students.models import Student
+                Student.objects.filter(
+                    enrollments__course=self, enrollments__grade__isnull=False
+                ).rebuild_gpa()
+
+        self._loaded_values = {**loaded, 'credits': self.credits, 'openings': self.openings}
 
     @property
-    def enrolled_count(self):
-        return self.enrollments.count()
+    def enrolled_students(self):
+        return self.enrolled_count
 
     @property
     def available_spots(self):
@@ -29,6 +79,18 @@ class Course(models.Model):
     def is_full(self):
         return self.enrolled_students >= self.openings
 
+    def reserve_seat(self):
+        """Atomically take one seat; returns False when the course is already full"""
+        if Course.objects.filter(pk=self.pk).reserve_seats():
+            self.enrolled_count += 1
+            return True
+        self.refresh_from_db(fields=['enrolled_count'])
+        return False
+
+    def release_seat(self):
+        Course.objects.filter(pk=self.pk).release_seats()
+        self.enrolled_count = max(0, self.enrolled_count - 1)
+
 
     @property
     def is_enrollment_open(self):
@@ -40,31 +102,51 @@ class Course(models.Model):
         return not self.is_full
 
     def process_waitlist(self):
-        from students.models import Enrollment
-
-        while not self.is_full:
-            next_request = self.enrollment_requests.filter(
-                status='waitlisted'
-            ).order_by('-priority', 'requested_at').first()
-
-            if not next_request:
-                break
-
-            try:
-                # Try to approve
-                next_request.status = 'pending'
-                next_request.save()
-
-                Enrollment.objects.create(
-                    student=next_request.student,course=self,enrolled_by=None)
-
-                next_request.status = 'approved'
-                next_request.reviewed_at = timezone.now()
-                next_request.notes = 'Auto-approved from waitlist'
-                next_request.save()
-            except ValidationError:
-                break
-
+        """Promote the top waitlisted requests into every free seat in one transaction"""
+        from students.models import Enrollment, EnrollmentRequest, OutboxEmail
+        from students.services import CourseFullError
+        from activity_logger import ActivityLogger
+
+        with transaction.atomic():
+            locked = Course.objects.select_for_update().get(pk=self.pk)
+            self.enrolled_count = locked.enrolled_count
+            if locked.is_full:
+                return []
+
+            already_enrolled = Enrollment.objects.filter(student=OuterRef('student'), course=self)
+            promoted = list(
+                self.enrollment_requests.filter(status='waitlisted')
+                .exclude(Exists(already_enrolled))
+                .select_related('student__user')
+                .order_by('-priority', 'requested_at')[:locked.available_spots]
+            )
+            if not promoted:
+                return []
+
+            # Enrollment.save() is bypassed, so take the seats in one guarded UPDATE; if the
+            # stored counter disagrees it matches nothing and the whole pass rolls back
+            if not Course.objects.filter(pk=self.pk).reserve_seats(len(promoted)):
+                raise CourseFullError(f'Course {self.code} is full ({locked.enrolled_count}/{locked.openings})')
+            Enrollment.objects.bulk_create([
+                Enrollment(student=request.student, course=self, enrolled_by=None)
+                for request in promoted
+            ])
+            self.enrolled_count += len(promoted)
+
+            reviewed_at = timezone.now()
+            for request in promoted:
+                request.course = self
+                request.status = 'approved'
+                request.reviewed_at = reviewed_at
+                request.notes = 'Auto-approved from waitlist'
+            EnrollmentRequest.objects.bulk_update(promoted, ['status', 'reviewed_at', 'notes'])
+
+            OutboxEmail.enqueue_many(request.approval_email() for request in promoted)
+            transaction.on_commit(lambda: ActivityLogger.log_enrollment_requests(
+                promoted, 'approved', reason='Auto-approved from waitlist'
+            ))
+
+        return promoted
 
     def __str__(self):
         return f'{self.code} - {self.name}'
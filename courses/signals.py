@@ -0,0 +1,13 @@
+# Signal handlers that react to course capacity changes
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from .models import Course
+from .waitlist import schedule_waitlist_processing
+
+
+@receiver(post_save, sender=Course)
+def promote_waitlist_on_new_openings(sender, instance, created, **kwargs):
+    """Fill seats added by raising openings from the waitlist"""
+    loaded = getattr(instance, '_loaded_values', {})
+    if not created and 'openings' in loaded and instance.openings > loaded['openings']:
+        schedule_waitlist_processing(instance.pk)
@@ -1,3 +1,280 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from io import StringIO
+from unittest import mock
+from courses.models import Course
+from courses.waitlist import WaitlistScheduler
+from pagination import encode_cursor
+from students.models import Student, Enrollment, EnrollmentRequest, OutboxEmail
+from students.services import CourseFullError
+from teachers.models import Teacher
 
-# Create your tests here.
+
+class CourseSeatCounterTestCase(TestCase):
+    def setUp(self):
+        self.course = Course.objects.create(name='Networks', code='CS340', credits=3, openings=2)
+        self.students = [
+            Student.objects.create(
+                user=User.objects.create_user(username=f'seat{i}', email=f'seat{i}@example.com', password='pass'),
+                first_name='Seat', last_name=str(i), age=20
+            )
+            for i in range(3)
+        ]
+
+    def test_enrollments_reserve_and_release_seats(self):
+        first = Enrollment.objects.create(student=self.students[0], course=self.course)
+        Enrollment.objects.create(student=self.students[1], course=self.course)
+        self.course.refresh_from_db()
+        assert self.course.enrolled_count == 2
+        assert self.course.is_full
+
+        # Guarded UPDATE refuses a third seat even from a stale in-memory course
+        stale = Course.objects.get(pk=self.course.pk)
+        stale.enrolled_count = 0
+        with self.assertRaises(ValidationError):
+            Enrollment.objects.create(student=self.students[2], course=stale)
+        assert Enrollment.objects.filter(course=self.course).count() == 2
+
+        first.delete()
+        self.course.refresh_from_db()
+        assert self.course.enrolled_count == 1
+        assert self.course.available_spots == 1
+
+    def test_capacity_check_needs_no_count_query(self):
+        Enrollment.objects.create(student=self.students[0], course=self.course)
+        course = Course.objects.get(pk=self.course.pk)
+        with self.assertNumQueries(0):
+            assert course.enrolled_students == 1
+            assert course.available_spots == 1
+            assert not course.is_full
+
+    def test_saving_course_does_not_overwrite_counter(self):
+        stale = Course.objects.get(pk=self.course.pk)
+        Enrollment.objects.create(student=self.students[0], course=self.course)
+        stale.name = 'Computer Networks'
+        stale.save()
+        self.course.refresh_from_db()
+        assert self.course.name == 'Computer Networks'
+        assert self.course.enrolled_count == 1
+
+    def test_rebuild_seat_counts_command(self):
+        Enrollment.objects.create(student=self.students[0], course=self.course)
+        Course.objects.update(enrolled_count=0)
+        call_command('rebuild_seat_counts', stdout=StringIO())
+        self.course.refresh_from_db()
+        assert self.course.enrolled_count == 1
+
+
+class WaitlistFixturesMixin:
+    def setUp(self):
+        self.course = Course.objects.create(name='Compilers', code='CS440', credits=3, openings=0)
+
+    def _waitlist(self, count, course=None):
+        requests = []
+        for i in range(count):
+            student = Student.objects.create(
+                user=User.objects.create_user(
+                    username=f'wl{course.code if course else ""}{i}', email=f'wl{i}@example.com', password='pass'),
+                first_name='Wait', last_name=str(i), age=20
+            )
+            requests.append(EnrollmentRequest.objects.create(
+                student=student, course=course or self.course, status='waitlisted', priority=i % 3
+            ))
+        return requests
+
+
+class WaitlistPromotionTestCase(WaitlistFixturesMixin, TestCase):
+    def test_promotes_top_requests_by_priority_then_age(self):
+        requests = self._waitlist(5)
+        self.course.openings = 3
+        self.course.save()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            promoted = self.course.process_waitlist()
+
+        # Priorities are 0,1,2,0,1 -> highest priority first, oldest first within a priority
+        assert [r.id for r in promoted] == [requests[2].id, requests[1].id, requests[4].id]
+        assert EnrollmentRequest.objects.filter(status='approved').count() == 3
+        assert Enrollment.objects.filter(course=self.course).count() == 3
+        self.course.refresh_from_db()
+        assert self.course.enrolled_count == 3
+        assert self.course.process_waitlist() == []
+        assert OutboxEmail.objects.filter(status='pending').count() == 3
+
+    def test_drifted_counter_rolls_back_instead_of_over_enrolling(self):
+        self._waitlist(2)
+        self.course.openings = 2
+        self.course.save()
+
+        with mock.patch('courses.models.CourseQuerySet.reserve_seats', return_value=0):
+            with self.assertRaises(CourseFullError):
+                self.course.process_waitlist()
+
+        assert not Enrollment.objects.filter(course=self.course).exists()
+        assert EnrollmentRequest.objects.filter(status='waitlisted').count() == 2
+        self.course.refresh_from_db()
+        assert self.course.enrolled_count == 0
+
+    def test_query_count_does_not_grow_with_promotions(self):
+        other = Course.objects.create(name='Linkers', code='CS441', credits=3, openings=0)
+        self._waitlist(2)
+        self._waitlist(8, course=other)
+        Course.objects.update(openings=10)
+
+        counts = []
+        for course in (Course.objects.get(pk=self.course.pk), Course.objects.get(pk=other.pk)):
+            with CaptureQueriesContext(connection) as queries:
+                course.process_waitlist()
+            counts.append(len(queries))
+        assert counts[0] == counts[1], counts
+
+
+@override_settings(WAITLIST_PROCESSING_DELAY=0)
+class AutomaticWaitlistTestCase(WaitlistFixturesMixin, TestCase):
+    def test_raising_openings_promotes_after_commit(self):
+        self._waitlist(2)
+        course = Course.objects.get(pk=self.course.pk)
+        course.openings = 1
+
+        with self.captureOnCommitCallbacks(execute=True):
+            course.save()
+        assert EnrollmentRequest.objects.filter(status='approved').count() == 1
+
+    def test_dropped_enrollment_promotes_after_commit(self):
+        waiting = self._waitlist(1)[0]
+        Course.objects.filter(pk=self.course.pk).update(openings=1)
+        dropping = Student.objects.create(
+            user=User.objects.create_user(username='drop', email='drop@example.com', password='pass'),
+            first_name='Drop', last_name='Out', age=20
+        )
+        enrollment = Enrollment.objects.create(student=dropping, course=Course.objects.get(pk=self.course.pk))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            enrollment.delete()
+        waiting.refresh_from_db()
+        assert waiting.status == 'approved'
+        assert Enrollment.objects.filter(course=self.course, student=waiting.student).exists()
+
+    def test_scheduler_coalesces_events_per_course(self):
+        passes = []
+        scheduler = WaitlistScheduler(runner=passes.append)
+        for course_id in (1, 2, 1, 1, 2):
+            scheduler.schedule(course_id, delay=60)
+        scheduler.flush()
+        assert passes == [{1, 2}]
+
+
+class KeysetPaginationTestCase(TestCase):
+    def setUp(self):
+        self.course = Course.objects.create(name='Algorithms', code='CS210', credits=3, openings=10)
+        users = User.objects.bulk_create([
+            User(username=f'page{i}', email=f'page{i}@example.com', password='!') for i in range(5)
+        ])
+        for i, user in enumerate(users):
+            Enrollment.objects.create(
+                student=Student.objects.create(user=user, first_name='Page', last_name=str(i), age=20),
+                course=self.course
+            )
+        # Ties on the sort key must be broken by id
+        Enrollment.objects.update(enrollment_date=timezone.now())
+
+    def _walk(self, url):
+        ids, cursor = [], None
+        while True:
+            resp = self.client.get(url, {'limit': 2, **({'cursor': cursor} if cursor else {})})
+            assert resp.status_code == 200
+            data = resp.json()
+            assert len(data['enrollments']) <= 2
+            assert data['total_enrollments'] == 5
+            ids += [row['id'] for row in data['enrollments']]
+            cursor = data['next_cursor']
+            if not cursor:
+                return ids
+
+    def test_pages_cover_every_row_once(self):
+        ids = self._walk(f'/api/courses/{self.course.id}/enrollments/')
+        assert ids == sorted(Enrollment.objects.values_list('id', flat=True), reverse=True)
+
+    def test_list_endpoints_advertise_next_page_in_headers(self):
+        Course.objects.create(name='Compilers', code='CS420', credits=3, openings=10)
+        resp = self.client.get('/api/courses/', {'limit': 1})
+        assert len(resp.json()) == 1
+        assert 'cursor=' in resp['Link'] and resp['X-Next-Cursor']
+        last = self.client.get('/api/courses/', {'cursor': resp['X-Next-Cursor']})
+        assert [course['code'] for course in last.json()] == ['CS420']
+        assert 'X-Next-Cursor' not in last
+        assert self.client.get('/api/courses/', {'cursor': 'garbage'}).status_code == 400
+
+    def test_cursor_values_of_the_wrong_type_are_rejected(self):
+        url = f'/api/courses/{self.course.id}/enrollments/'
+        for values in (['abc'], [5, 'abc'], [{'dt': timezone.now().isoformat()}, 'abc'], ['not a date', 1]):
+            assert self.client.get('/api/courses/', {'cursor': encode_cursor(values)}).status_code == 400
+            assert self.client.get(url, {'cursor': encode_cursor(values)}).status_code == 400
+
+
+class CourseCountQueryTestCase(TestCase):
+    def setUp(self):
+        self.teacher = Teacher.objects.create(
+            user=User.objects.create_user(username='counts', email='counts@example.com', password='pass'),
+            first_name='Count', last_name='Von', subject='Math'
+        )
+        self.student = Student.objects.create(
+            user=User.objects.create_user(username='counted', email='counted@example.com', password='pass'),
+            first_name='Counted', last_name='Student', age=20
+        )
+        self._add_courses(2)
+
+    def _add_courses(self, count):
+        start = Course.objects.count()
+        for i in range(start, start + count):
+            course = Course.objects.create(name=f'Course {i}', code=f'CNT{i}', credits=3, openings=5)
+            course.teachers.add(self.teacher)
+            Enrollment.objects.create(student=self.student, course=course)
+            EnrollmentRequest.objects.create(course=course, student=Student.objects.create(
+                user=User.objects.create_user(username=f'asks{i}', email=f'asks{i}@example.com', password='!'),
+                first_name='Asks', last_name=str(i), age=19
+            ))
+
+    def _query_counts(self):
+        counts = []
+        for url in ('/api/courses/', f'/api/teachers/{self.teacher.id}/courses/'):
+            with CaptureQueriesContext(connection) as queries:
+                assert self.client.get(url).status_code == 200
+            counts.append(len(queries))
+        return counts
+
+    def test_query_count_does_not_grow_with_courses(self):
+        before = self._query_counts()
+        self._add_courses(5)
+        assert self._query_counts() == before
+
+        courses = self.client.get('/api/courses/').json()
+        assert all(course['enrolled_students'] == 1 for course in courses)
+        mine = self.client.get(f'/api/teachers/{self.teacher.id}/courses/').json()
+        assert mine['total_courses'] == 7
+        assert all(course['student_count'] == 1 for course in mine['courses'])
+
+    def test_template_pages_run_a_fixed_number_of_queries(self):
+        self.client.login(username='counts', password='pass')
+        first_course = Course.objects.order_by('id').first()
+        pages = ('/courses-list/', '/teacher-dashboard/', '/teachers-list/',
+                 f'/manage-course/{first_course.id}/', f'/teacher-course-students/{first_course.id}/')
+
+        def page_queries():
+            counts = []
+            for url in pages:
+                with CaptureQueriesContext(connection) as queries:
+                    assert self.client.get(url).status_code == 200
+                counts.append(len(queries))
+            return counts
+
+        before = page_queries()
+        self._add_courses(5)
+        for student in Student.objects.filter(last_name__in=['2', '3', '4']):
+            Enrollment.objects.create(student=student, course=first_course)
+        assert page_queries() == before
@@ -5,6 +5,7 @@ app_name = 'courses'
 
 urlpatterns = [
     path('', views.course_list, name='course_list'),
+    path('export/', views.export_courses, name='export_courses'),
     path('<int:course_id>/', views.course_detail, name='course_detail'),
     path('<int:course_id>/enrollments/', views.course_enrollments, name='course_enrollments'),
     path('<int:course_id>/openings/', views.course_openings, name='course_openings')
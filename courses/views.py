@@ -1,24 +1,35 @@
 
 from django.http import JsonResponse
+from django.db.models import F
 from django.shortcuts import get_object_or_404
 from django.views.decorators.http import require_http_methods
 from .models import Course
 from students.models import Enrollment
+from pagination import paginate, paginated_list_response, handle_page_errors
+from streaming import export_response
 
 
 @require_http_methods(["GET"])
+@handle_page_errors
 def course_list(request):
     courses = Course.objects.all().values(
-        'id', 'name', 'code', 'description', 'credits', 'created_at','openings'
+        'id', 'name', 'code', 'description', 'credits', 'created_at','openings',
+        enrolled_students=F('enrolled_count')
     )
+    courses, next_cursor = paginate(request, courses, ('id',))
 
-    courses_list = []
-    for course in courses:
-        enrollment_count = Enrollment.objects.filter(course_id=course['id']).count()
-        course['enrolled_students'] = enrollment_count
-        courses_list.append(course)
+    return paginated_list_response(request, courses, next_cursor)
 
-    return JsonResponse(courses_list, safe=False)
+
+@require_http_methods(["GET"])
+def export_courses(request):
+    """Stream every course with its seat counts as JSON (default) or CSV (?format=csv)"""
+    fields = ('id', 'code', 'name', 'credits', 'openings', 'enrolled_count', 'created_at')
+    courses = Course.objects.values_list(*fields).order_by('id')
+    return export_response(
+        request, 'courses', fields + ('available_spots',), courses,
+        transform=lambda row: row + (max(row[4] - row[5], 0),)
+    )
 
 
 @require_http_methods(["GET"])
@@ -29,8 +40,6 @@ def course_detail(request, course_id):
         'id', 'first_name', 'last_name', 'subject'
     )
 
-    enrollment_count = Enrollment.objects.filter(course=course).count()
-
     data = {
         'id': course.id,
         'name': course.name,
@@ -38,7 +47,7 @@ def course_detail(request, course_id):
         'description': course.description,
         'credits': course.credits,
         'created_at': course.created_at,
-        'enrolled_students': enrollment_count,
+        'enrolled_students': course.enrolled_count,
         'openings' : course.openings,
         'teachers': list(teachers)
     }
@@ -52,6 +61,7 @@ def course_openings(request, course_id):
 
 
 @require_http_methods(["GET"])
+@handle_page_errors
 def course_enrollments(request, course_id):
     course = get_object_or_404(Course, id=course_id)
 
@@ -67,7 +77,8 @@ def course_enrollments(request, course_id):
         'grade',
         'enrolled_by__first_name',
         'enrolled_by__last_name'
-    ).order_by('-enrollment_date')
+    )
+    enrollments, next_cursor = paginate(request, enrollments, ('-enrollment_date', '-id'))
 
     return JsonResponse({
         'course': {
@@ -75,7 +86,8 @@ def course_enrollments(request, course_id):
             'name': course.name,
             'code': course.code
         },
-        'total_enrollments': len(enrollments),
-        'enrollments': list(enrollments)
+        'total_enrollments': course.enrolled_count,
+        'enrollments': enrollments,
+        'next_cursor': next_cursor
     })
 
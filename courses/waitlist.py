@@ -0,0 +1,78 @@
+# Debounced background waitlist processing for courses that gained free seats
+import atexit
+import threading
+from django.conf import settings
+from django.db import connection, transaction
+
+
+def process_waitlists(course_ids):
+    """Run one promotion pass for each course id"""
+    from .models import Course
+
+    for course in Course.objects.filter(pk__in=course_ids):
+        try:
+            course.process_waitlist()
+        except Exception as e:
+            print(f"Error processing waitlist for {course.code}: {e}")
+
+
+class WaitlistScheduler:
+    """
+    Coalesces seat-freeing events into one delayed promotion pass per course
+
+    The first event for an idle scheduler starts a timer; every course scheduled
+    before it fires is processed once when it does.
+    """
+
+    def __init__(self, runner=process_waitlists):
+        self.runner = runner
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._timer = None
+
+    def schedule(self, course_id, delay):
+        with self._lock:
+            self._pending.add(course_id)
+            if self._timer is None:
+                self._timer = threading.Timer(delay, self._run_in_background)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        """Process everything pending right now - registered with atexit for shutdown"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+        self._run()
+
+    def _run_in_background(self):
+        try:
+            self._run()
+        finally:
+            # Timer threads get their own DB connection - don't leak it
+            connection.close()
+
+    def _run(self):
+        with self._lock:
+            course_ids, self._pending = self._pending, set()
+            self._timer = None
+        if course_ids:
+            self.runner(course_ids)
+
+
+scheduler = WaitlistScheduler()
+# Timers are daemon threads, so promotions still waiting on one would be lost at exit
+atexit.register(scheduler.flush)
+
+
+def schedule_waitlist_processing(course_id):
+    """Queue a waitlist pass for the course once the current transaction commits"""
+    delay = getattr(settings, 'WAITLIST_PROCESSING_DELAY', 2.0)
+
+    def enqueue():
+        if delay:
+            scheduler.schedule(course_id, delay)
+        else:
+            process_waitlists([course_id])
+
+    transaction.on_commit(enqueue)
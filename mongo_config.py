@@ -2,25 +2,72 @@
 from pymongo import MongoClient
 from pymongo.errors import ConnectionFailure
 import os
+import threading
+import time
 from dotenv import load_dotenv
+from request_metrics import MongoCommandTimer
 
 load_dotenv()
 
 
 class MongoDBConnection:
-    """Singleton MongoDB connection manager"""
+    """
+    Singleton MongoDB connection manager
+
+    Nothing touches the network until the connection is first used, which connects
+    with a short server selection timeout; after a failed attempt, further lazy
+    attempts wait RETRY_INTERVAL seconds (reconnect() forces one). Request-path
+    writes use get_db(wait=False) and spool instead of waiting.
+    Indexes are created by the create_mongo_indexes management command.
+    """
     _instance = None
     _client = None
     _db = None
+    _retry_at = 0.0
+    _lock = threading.Lock()
+    _start_lock = threading.Lock()
+    _connect_thread = None
+
+    RETRY_INTERVAL = float(os.getenv('MONGODB_RECONNECT_INTERVAL', 30))
+    # How long a lazy connect, or a read once MongoDB goes away, waits for a server
+    SERVER_SELECTION_TIMEOUT_MS = int(os.getenv('MONGODB_SERVER_SELECTION_TIMEOUT_MS', 2000))
 
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(MongoDBConnection, cls).__new__(cls)
         return cls._instance
 
-    def __init__(self):
-        if self._client is None:
+    def _ensure_connected(self, force=False, wait=True):
+        if self._db is not None:
+            return
+        if force:
+            with self._lock:
+                self._attempt(force=True)
+            return
+        if time.monotonic() < self._retry_at:
+            return
+        if wait:
+            # Bounded by SERVER_SELECTION_TIMEOUT_MS, and only once per RETRY_INTERVAL while down
+            with self._lock:
+                self._attempt()
+            return
+        with self._start_lock:
+            if self._connect_thread is None or not self._connect_thread.is_alive():
+                self._connect_thread = threading.Thread(
+                    target=self._connect_in_background, name="mongo-connect", daemon=True
+                )
+                self._connect_thread.start()
+
+    def _connect_in_background(self):
+        with self._lock:
+            self._attempt()
+
+    def _attempt(self, force=False):
+        """Connect unless already connected or backing off (lock held)"""
+        if self._db is None and (force or time.monotonic() >= self._retry_at):
             self._connect()
+            if self._db is None:
+                self._retry_at = time.monotonic() + self.RETRY_INTERVAL
 
     def _connect(self):
         """Establish MongoDB connection"""
@@ -32,8 +79,10 @@ class MongoDBConnection:
             # Create MongoDB client
             self._client = MongoClient(
                 mongo_uri,
-                serverSelectionTimeoutMS=5000,  # 5 second timeout
-                connectTimeoutMS=10000
+                serverSelectionTimeoutMS=self.SERVER_SELECTION_TIMEOUT_MS,
+                connectTimeoutMS=10000,
+                # Attributes command round trips to the request that issued them
+                event_listeners=[MongoCommandTimer()]
             )
 
             # Test connection
@@ -43,48 +92,62 @@ class MongoDBConnection:
             self._db = self._client[db_name]
             
             print(f"✓ Connected to MongoDB database: {db_name}")
-            
-            # Create indexes for better performance
-            self._create_indexes()
 
         except ConnectionFailure as e:
             print(f"✗ Failed to connect to MongoDB: {e}")
-            print("  MongoDB logging will be disabled.")
-            self._client = None
-            self._db = None
+            print("  MongoDB logging will be disabled until it reconnects.")
+            self.close()
         except Exception as e:
             print(f"✗ MongoDB connection error: {e}")
-            self._client = None
-            self._db = None
+            self.close()
+
+    def create_indexes(self):
+        """Create indexes for collections; returns False if MongoDB is unavailable"""
+        if not self.reconnect():
+            return False
+
+        # Activity logs indexes
+        self._db.activity_logs.create_index([("timestamp", -1)])  # Descending for recent first
+        self._db.activity_logs.create_index([("action_type", 1)])
+        self._db.activity_logs.create_index([("user_id", 1)])
+        self._db.activity_logs.create_index([("user_type", 1)])
+
+        # Notification logs indexes
+        self._db.notification_logs.create_index([("created_at", -1)])
+        self._db.notification_logs.create_index([("recipient_email", 1)])
+        self._db.notification_logs.create_index([("status", 1)])
+        return True
+
+    def reconnect(self):
+        """Try to connect again if the last attempt failed; returns is_connected"""
+        self._ensure_connected(force=True)
+        return self._db is not None
 
-    def _create_indexes(self):
-        """Create indexes for collections"""
-        if self._db is not None:
-            # Activity logs indexes
-            self._db.activity_logs.create_index([("timestamp", -1)])  # Descending for recent first
-            self._db.activity_logs.create_index([("action_type", 1)])
-            self._db.activity_logs.create_index([("user_id", 1)])
-            self._db.activity_logs.create_index([("user_type", 1)])
-            
-            # Notification logs indexes
-            self._db.notification_logs.create_index([("created_at", -1)])
-            self._db.notification_logs.create_index([("recipient_email", 1)])
-            self._db.notification_logs.create_index([("status", 1)])
+    def get_db(self, wait=True):
+        """
+        The database, or None if MongoDB is unavailable
+
+        wait=False never blocks: without a connection it starts one in the background
+        and returns None, for writes that can be spooled instead.
+        """
+        self._ensure_connected(wait=wait)
+        return self._db
 
     @property
     def db(self):
-        return self._db
+        return self.get_db()
 
     @property
     def is_connected(self):
-        return self._db is not None
+        return self.get_db() is not None
 
     def close(self):
         if self._client:
             self._client.close()
-            self._client = None
-            self._db = None
-            print("✓ MongoDB connection closed")
+            if self._db is not None:
+                print("✓ MongoDB connection closed")
+        self._client = None
+        self._db = None
 
 
 mongo_connection = MongoDBConnection()
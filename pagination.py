@@ -0,0 +1,157 @@
+# Keyset (cursor) pagination for the JSON list endpoints
+import base64
+import binascii
+import json
+from datetime import date, datetime
+from functools import wraps
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.http import JsonResponse
+from django.utils.dateparse import parse_date, parse_datetime
+
+
+class InvalidPageRequest(ValueError):
+    pass
+
+
+def encode_cursor(values):
+    """Opaque cursor for the sort-key values of the last row on a page"""
+    tagged = []
+    for value in values:
+        # Keep full microsecond precision - DjangoJSONEncoder would truncate it
+        if isinstance(value, datetime):
+            tagged.append({'dt': value.isoformat()})
+        elif isinstance(value, date):
+            tagged.append({'d': value.isoformat()})
+        else:
+            tagged.append(value)
+    raw = json.dumps(tagged, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        tagged = json.loads(raw)
+    except (binascii.Error, ValueError):
+        raise InvalidPageRequest('Invalid cursor')
+    if not isinstance(tagged, list):
+        raise InvalidPageRequest('Invalid cursor')
+
+    values = []
+    for value in tagged:
+        try:
+            if isinstance(value, dict) and 'dt' in value:
+                value = parse_datetime(value['dt'])
+            elif isinstance(value, dict) and 'd' in value:
+                value = parse_date(value['d'])
+        except (TypeError, ValueError):
+            value = None
+        if value is None or isinstance(value, (dict, list)):
+            raise InvalidPageRequest('Invalid cursor')
+        values.append(value)
+    return values
+
+
+def page_limit(request):
+    """?limit=, defaulting to API_PAGE_SIZE and capped at API_MAX_PAGE_SIZE"""
+    default = getattr(settings, 'API_PAGE_SIZE', 50)
+    maximum = getattr(settings, 'API_MAX_PAGE_SIZE', 200)
+    try:
+        limit = int(request.GET.get('limit', default))
+    except ValueError:
+        raise InvalidPageRequest('limit must be an integer')
+    if limit < 1:
+        raise InvalidPageRequest('limit must be positive')
+    return min(limit, maximum)
+
+
+def _ordering_field(queryset, name):
+    """Model field (or annotation output field) behind an ordering key like student__last_name"""
+    annotation = queryset.query.annotations.get(name)
+    if annotation is not None:
+        return annotation.output_field
+    model = queryset.model
+    *path, last = name.split('__')
+    for part in path:
+        model = model._meta.get_field(part).related_model
+    return model._meta.get_field(last)
+
+
+def _cursor_values(queryset, ordering, values):
+    """Cursor values converted to their ordering fields' types - a mismatch is a bad cursor"""
+    if len(values) != len(ordering):
+        raise InvalidPageRequest('Invalid cursor')
+    try:
+        return [_ordering_field(queryset, field.lstrip('-')).to_python(value)
+                for field, value in zip(ordering, values)]
+    except (TypeError, ValueError, ValidationError):
+        raise InvalidPageRequest('Invalid cursor')
+
+
+def _after(ordering, values):
+    """Rows strictly after the cursor in the given ordering"""
+    keys = [(field.lstrip('-'), field.startswith('-')) for field in ordering]
+
+    after = Q()
+    equal = {}
+    for (name, descending), value in zip(keys, values):
+        after |= Q(**equal, **{f'{name}__{"lt" if descending else "gt"}': value})
+        equal[name] = value
+
+    # The redundant bound on the leading key lets the database do a single index range scan
+    first, descending = keys[0]
+    return Q(**{f'{first}__{"lte" if descending else "gte"}': values[0]}) & after
+
+
+def paginate(request, queryset, ordering):
+    """
+    One keyset page of a values() queryset, as (rows, next_cursor)
+
+    ordering must end with a unique key (usually id) and every ordering field must
+    be one of the selected values. next_cursor is None on the last page.
+    """
+    limit = page_limit(request)
+    queryset = queryset.order_by(*ordering)
+
+    cursor = request.GET.get('cursor')
+    if cursor:
+        values = _cursor_values(queryset, ordering, decode_cursor(cursor))
+        try:
+            queryset = queryset.filter(_after(ordering, values))
+        except (TypeError, ValueError, ValidationError):
+            raise InvalidPageRequest('Invalid cursor')
+
+    rows = list(queryset[:limit + 1])
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1][field.lstrip('-')] for field in ordering])
+    return rows, next_cursor
+
+
+def add_pagination_headers(request, response, next_cursor):
+    """X-Next-Cursor and an RFC 8288 Link header pointing at the next page"""
+    if next_cursor:
+        query = request.GET.copy()
+        query['cursor'] = next_cursor
+        response['X-Next-Cursor'] = next_cursor
+        response['Link'] = f'<{request.build_absolute_uri(request.path)}?{query.urlencode()}>; rel="next"'
+    return response
+
+
+def paginated_list_response(request, rows, next_cursor):
+    """A plain JSON list body with the next page advertised in headers"""
+    return add_pagination_headers(request, JsonResponse(rows, safe=False), next_cursor)
+
+
+def handle_page_errors(view_func):
+    """Turn a bad cursor or limit into a 400 JSON error"""
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view_func(request, *args, **kwargs)
+        except InvalidPageRequest as e:
+            return JsonResponse({'error': str(e)}, status=400)
+    return wrapper
@@ -0,0 +1,152 @@
+# Per-request SQL, MongoDB and view timing: Server-Timing headers and structured log lines
+import json
+import logging
+import time
+from collections import Counter
+from contextlib import ExitStack
+from contextvars import ContextVar
+from django.conf import settings
+from django.db import connections
+from pymongo import monitoring
+
+logger = logging.getLogger('request_metrics')
+
+DEFAULTS = {
+    'ENABLED': True,
+    'SERVER_TIMING': True,
+    'QUERY_COUNT_THRESHOLD': 20,
+    'REPEATED_QUERY_THRESHOLD': 5,
+    'SLOW_REQUEST_MS': 500,
+    'LOG_ALL_REQUESTS': False,
+}
+
+_current = ContextVar('request_metrics', default=None)
+
+
+def metrics_settings():
+    return {**DEFAULTS, **getattr(settings, 'REQUEST_METRICS', {})}
+
+
+class RequestMetrics:
+    """Counters for one request, filled in by the SQL wrapper and the MongoDB listener"""
+
+    def __init__(self):
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.mongo_count = 0
+        self.mongo_seconds = 0.0
+        self.view_started = None
+        self.statements = Counter()
+
+    def sql_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_seconds += time.perf_counter() - started
+            self.sql_count += 1
+            # sql still has its placeholders, so repeats of one statement share a key
+            self.statements[sql] += 1
+
+    def record_mongo(self, duration_micros):
+        self.mongo_count += 1
+        self.mongo_seconds += duration_micros / 1_000_000
+
+
+class MongoCommandTimer(monitoring.CommandListener):
+    """
+    Adds MongoDB command round trips to the metrics of the request that issued them
+
+    Commands from the buffered activity writer run on its own thread, outside any
+    request, and are not counted.
+    """
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        metrics = _current.get()
+        if metrics is not None:
+            metrics.record_mongo(event.duration_micros)
+
+    def failed(self, event):
+        self.succeeded(event)
+
+
+class RequestMetricsMiddleware:
+    """
+    Record query counts and time spent in SQL, MongoDB and the view for every request
+
+    Totals go out as a Server-Timing header. Requests over the REQUEST_METRICS query
+    count, repeated-statement or latency thresholds are logged as a JSON warning
+    naming the view. Queries run while a streaming response is iterated are not counted.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.config = metrics_settings()
+
+    def __call__(self, request):
+        if not self.config['ENABLED']:
+            return self.get_response(request)
+
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics.sql_wrapper))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        finished = time.perf_counter()
+        total_seconds = finished - started
+        # From the view being called until its response came back through the inner middleware
+        view_seconds = finished - metrics.view_started if metrics.view_started else 0.0
+
+        if self.config['SERVER_TIMING']:
+            response['Server-Timing'] = ', '.join([
+                f'db;dur={metrics.sql_seconds * 1000:.1f};desc="{metrics.sql_count} queries"',
+                f'mongo;dur={metrics.mongo_seconds * 1000:.1f};desc="{metrics.mongo_count} calls"',
+                f'view;dur={view_seconds * 1000:.1f}',
+                f'total;dur={total_seconds * 1000:.1f}',
+            ])
+        self.log(request, response, metrics, total_seconds, view_seconds)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = _current.get()
+        if metrics is not None:
+            metrics.view_started = time.perf_counter()
+
+    def log(self, request, response, metrics, total_seconds, view_seconds):
+        flags = []
+        if metrics.sql_count > self.config['QUERY_COUNT_THRESHOLD']:
+            flags.append('too_many_queries')
+        repeated_sql, repeats = (metrics.statements.most_common(1) or [('', 0)])[0]
+        if repeats > self.config['REPEATED_QUERY_THRESHOLD']:
+            flags.append('repeated_query')
+        if total_seconds * 1000 > self.config['SLOW_REQUEST_MS']:
+            flags.append('slow')
+        if not flags and not self.config['LOG_ALL_REQUESTS']:
+            return
+
+        match = request.resolver_match
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'view': match._func_path if match else None,
+            'url_name': match.view_name if match else None,
+            'status': response.status_code,
+            'total_ms': round(total_seconds * 1000, 1),
+            'view_ms': round(view_seconds * 1000, 1),
+            'sql_count': metrics.sql_count,
+            'sql_ms': round(metrics.sql_seconds * 1000, 1),
+            'mongo_count': metrics.mongo_count,
+            'mongo_ms': round(metrics.mongo_seconds * 1000, 1),
+            'flags': flags,
+        }
+        if 'repeated_query' in flags:
+            record['repeated_query'] = {'count': repeats, 'sql': repeated_sql[:300]}
+        logger.log(logging.WARNING if flags else logging.INFO, json.dumps(record))
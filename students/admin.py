@@ -1,58 +1,64 @@
 from django.contrib import admin
-from .models import Student, Enrollment, EnrollmentRequest
+from .models import Student, Enrollment, EnrollmentRequest, OutboxEmail
+from .services import bulk_approve_requests, bulk_reject_requests
 @admin.register(Student)
 class StudentAdmin(admin.ModelAdmin):
     list_display = ['first_name', 'last_name', 'age', 'gpa', 'user']
+    list_select_related = ['user']
     search_fields = ['first_name', 'last_name']
+    autocomplete_fields = ['user']
 
 @admin.register(Enrollment)
 class EnrollmentAdmin(admin.ModelAdmin):
     list_display = ['student', 'course', 'enrolled_by', 'enrollment_date', 'grade']
-    list_filter = ['enrollment_date', 'course']
-    search_fields = ['student__first_name', 'student__last_name', 'course__name']
+    list_select_related = ['student', 'course', 'enrolled_by']
+    # Filter by course through search - a course list_filter loads every course on each page
+    list_filter = ['enrollment_date']
+    search_fields = ['student__first_name', 'student__last_name', 'course__name', 'course__code']
+    autocomplete_fields = ['student', 'course', 'enrolled_by']
+    show_full_result_count = False
 
 @admin.register(EnrollmentRequest)
 class EnrollmentRequestAdmin(admin.ModelAdmin):
     list_display = ['student', 'course', 'status', 'requested_at', 'reviewed_by', 'priority']
-    list_filter = ['status', 'requested_at', 'course']
-    search_fields = ['student__first_name', 'student__last_name', 'course__name']
+    list_select_related = ['student', 'course', 'reviewed_by']
+    list_filter = ['status', 'requested_at']
+    search_fields = ['student__first_name', 'student__last_name', 'course__name', 'course__code']
+    autocomplete_fields = ['student', 'course', 'reviewed_by']
+    show_full_result_count = False
     actions = ['approve_requests', 'reject_requests']
     readonly_fields = ['requested_at', 'reviewed_at']
 
     def approve_requests(self, request, queryset):
-        approved_count = 0
-        failed_count = 0
-        errors = []
-
-        for enrollment_request in queryset.filter(status='pending'):
-            try:
-                # Use the proper approve method which checks capacity
-                enrollment_request.approve(teacher=None)
-                approved_count += 1
-            except Exception as e:
-                failed_count += 1
-                errors.append(f"{enrollment_request.student} - {enrollment_request.course}: {str(e)}")
-
-        if approved_count:
-            self.message_user(request, f"Successfully approved {approved_count} request(s).")
-        if failed_count:
-            error_message = f"Failed to approve {failed_count} request(s). Errors: " + "; ".join(errors[:5])
-            if len(errors) > 5:
-                error_message += f" and {len(errors) - 5} more..."
-            self.message_user(request, error_message, level='warning')
+        # Set-based: seats, enrollments, statuses and emails are written per batch, not per row
+        review = bulk_approve_requests(queryset.values_list('pk', flat=True))
+        self._report(request, review, 'approved')
 
     approve_requests.short_description = "Approve selected requests (checks capacity)"
 
     def reject_requests(self, request, queryset):
-        rejected_count = 0
-        for enrollment_request in queryset.exclude(status='rejected'):
-            try:
-                enrollment_request.reject(teacher=None, reason='Rejected by admin')
-                rejected_count += 1
-            except Exception as e:
-                self.message_user(request, f"Error rejecting {enrollment_request}: {str(e)}", level='error')
-
-        if rejected_count:
-            self.message_user(request, f"Successfully rejected {rejected_count} request(s).")
+        review = bulk_reject_requests(queryset.values_list('pk', flat=True), reason='Rejected by admin')
+        self._report(request, review, 'rejected')
 
     reject_requests.short_description = "Reject selected requests"
+
+    def _report(self, request, review, action):
+        if not review.outcomes:
+            self.message_user(request, f"No selected request could be {action}.", level='warning')
+            return
+
+        per_course = "; ".join(
+            f"{code}: " + ", ".join(f"{count} {outcome.replace('_', ' ')}" for outcome, count in sorted(counts.items()))
+            for code, counts in sorted(review.by_course.items())
+        )
+        done = sum(1 for outcome in review.outcomes.values() if outcome == action)
+        level = 'success' if done == len(review.outcomes) else 'warning'
+        self.message_user(request, f"Successfully {action} {done} request(s). {per_course}", level=level)
+
+
+@admin.register(OutboxEmail)
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = ['recipient', 'subject', 'status', 'attempts', 'next_attempt_at', 'sent_at']
+    list_filter = ['status']
+    search_fields = ['recipient', 'subject']
+    readonly_fields = ['created_at', 'sent_at', 'last_error']
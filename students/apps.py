@@ -5,3 +5,6 @@ from django.apps import AppConfig
 class SchoolConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'students'
+
+    def ready(self):
+        from . import signals  # noqa: F401
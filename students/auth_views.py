@@ -8,6 +8,7 @@ from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.models import User
 from students.models import Student
 from teachers.models import Teacher
+from user_roles import get_user_role
 import json
 
 
@@ -72,8 +73,7 @@ def register_student(request):
             user=user,
             first_name=data.get('first_name'),
             last_name=data.get('last_name'),
-            age=data.get('age'),
-            gpa=data.get('gpa', 0.0)
+            age=data.get('age')
         )
 
         return JsonResponse({
@@ -135,21 +135,13 @@ def user_login(request):
         if user is not None:
             login(request, user)
 
-            user_type = None
-            profile_id = None
-
-            if hasattr(user, 'teacher_profile'):
-                user_type = 'teacher'
-                profile_id = user.teacher_profile.id
-            elif hasattr(user, 'student_profile'):
-                user_type = 'student'
-                profile_id = user.student_profile.id
+            role = get_user_role(user)
 
             return JsonResponse({
                 'message': 'Login successful',
-                'user_type': user_type,
+                'user_type': role.user_type,
                 'user_id': user.id,
-                'profile_id': profile_id,
+                'profile_id': role.profile_id,
                 'username': user.get_username()
             })
         else:
@@ -0,0 +1,108 @@
+"""
+JWT authentication that trusts the role claims signed into the token
+"""
+from django.contrib.auth.models import User
+from django.utils.functional import cached_property
+from rest_framework.authentication import SessionAuthentication
+from rest_framework_simplejwt.authentication import JWTAuthentication, JWTStatelessUserAuthentication
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+from user_roles import get_user_role, prime_user_role
+
+
+class RoleClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that resolves user_type/profile_id from the token claims
+
+    Claims issued before the user's profile was created or deleted are ignored,
+    and the role is looked up from the database as usual.
+    """
+
+    def get_user(self, validated_token):
+        user = super().get_user(validated_token)
+        prime_user_role(user, validated_token)
+        return user
+
+
+class ClaimsUser(TokenUser):
+    """
+    Token-backed user: id, username, email, staff flags and role come from the claims
+
+    Any other attribute loads the User row on first access (once per request), so a
+    view that only needs the id and role never touches the auth_user table.
+    """
+
+    CLAIM_ATTRIBUTES = ('username', 'email', 'is_staff', 'is_superuser')
+
+    @cached_property
+    def id(self):
+        return User._meta.pk.to_python(self.token[api_settings.USER_ID_CLAIM])
+
+    @cached_property
+    def pk(self):
+        return self.id
+
+    @cached_property
+    def user(self):
+        """The full User instance, for views that need it"""
+        return User.objects.get(pk=self.id)
+
+    def _claim(self, name):
+        if name in self.token:
+            return self.token[name]
+        return getattr(self.user, name)
+
+    @cached_property
+    def username(self):
+        return self._claim('username')
+
+    @cached_property
+    def email(self):
+        return self._claim('email')
+
+    @cached_property
+    def is_staff(self):
+        return self._claim('is_staff')
+
+    @cached_property
+    def is_superuser(self):
+        return self._claim('is_superuser')
+
+    def __getattr__(self, name):
+        # Only called for attributes TokenUser doesn't define
+        if name.startswith('_') or name == 'token':
+            raise AttributeError(name)
+        return getattr(self.user, name)
+
+    def __eq__(self, other):
+        if isinstance(other, (TokenUser, User)):
+            return self.pk == other.pk
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.pk)
+
+
+class ClaimsJWTAuthentication(JWTStatelessUserAuthentication):
+    """
+    Opt-in authentication that builds a ClaimsUser instead of fetching the User
+
+    The user's is_active flag is not rechecked, so a deactivated account keeps
+    working until its access token expires.
+    """
+
+    def get_user(self, validated_token):
+        user = ClaimsUser(super().get_user(validated_token).token)
+        if not prime_user_role(user, validated_token):
+            # Stale or missing role claims - resolve from the database
+            user._role_cache = get_user_role(user.user)
+        return user
+
+
+# For @authentication_classes on views that only need the user id and role
+CLAIMS_AUTHENTICATION_CLASSES = [ClaimsJWTAuthentication, SessionAuthentication]
+
+
+def full_user(user):
+    """The User model instance behind request.user, loading it for a ClaimsUser"""
+    return user.user if isinstance(user, ClaimsUser) else user
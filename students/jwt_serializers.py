@@ -3,6 +3,16 @@ Custom JWT serializers for authentication with user type information
 """
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from rest_framework import serializers
+from user_roles import get_user_role, role_claims
+
+
+def user_profile(user, role):
+    """The teacher or student profile behind the user's role (already loaded by get_user_role)"""
+    if role.is_teacher:
+        return user.teacher_profile
+    if role.is_student:
+        return user.student_profile
+    return None
 
 
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
@@ -17,21 +27,16 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
         # Add custom claims to the token
         token['username'] = user.username
         token['email'] = user.email
+        token['is_staff'] = user.is_staff
+        token['is_superuser'] = user.is_superuser
 
-        # Determine user type and add to token
-        if hasattr(user, 'teacher_profile'):
-            token['user_type'] = 'teacher'
-            token['profile_id'] = user.teacher_profile.id
-            token['first_name'] = user.teacher_profile.first_name
-            token['last_name'] = user.teacher_profile.last_name
-        elif hasattr(user, 'student_profile'):
-            token['user_type'] = 'student'
-            token['profile_id'] = user.student_profile.id
-            token['first_name'] = user.student_profile.first_name
-            token['last_name'] = user.student_profile.last_name
-        else:
-            token['user_type'] = 'admin'
-            token['profile_id'] = None
+        # Role claims let RoleClaimsJWTAuthentication skip the profile lookups
+        role = get_user_role(user)
+        for claim, value in role_claims(role).items():
+            token[claim] = value
+        profile = user_profile(user, role)
+        token['first_name'] = profile.first_name if profile else ''
+        token['last_name'] = profile.last_name if profile else ''
 
         return token
 
@@ -41,30 +46,17 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
         # Add extra responses to the token response
         user = self.user
 
-        user_type = None
-        profile_id = None
-        first_name = ''
-        last_name = ''
-
-        if hasattr(user, 'teacher_profile'):
-            user_type = 'teacher'
-            profile_id = user.teacher_profile.id
-            first_name = user.teacher_profile.first_name
-            last_name = user.teacher_profile.last_name
-        elif hasattr(user, 'student_profile'):
-            user_type = 'student'
-            profile_id = user.student_profile.id
-            first_name = user.student_profile.first_name
-            last_name = user.student_profile.last_name
+        role = get_user_role(user)
+        profile = user_profile(user, role)
 
         data.update({
             'user_id': user.id,
             'username': user.username,
             'email': user.email,
-            'user_type': user_type,
-            'profile_id': profile_id,
-            'first_name': first_name,
-            'last_name': last_name,
+            'user_type': role.user_type,
+            'profile_id': role.profile_id,
+            'first_name': profile.first_name if profile else '',
+            'last_name': profile.last_name if profile else '',
         })
 
         return data
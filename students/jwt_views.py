@@ -6,6 +6,7 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
+from user_roles import get_request_role
 from .jwt_serializers import CustomTokenObtainPairSerializer
 
 
@@ -32,7 +33,8 @@ def get_user_profile(request):
         'is_staff': user.is_staff,
     }
 
-    if hasattr(user, 'teacher_profile'):
+    role = get_request_role(request)
+    if role.is_teacher:
         teacher = user.teacher_profile
         user_data.update({
             'user_type': 'teacher',
@@ -42,7 +44,7 @@ def get_user_profile(request):
             'subject': teacher.subject,
             'courses': list(teacher.courses.values('id', 'name', 'code'))
         })
-    elif hasattr(user, 'student_profile'):
+    elif role.is_student:
         student = user.student_profile
         user_data.update({
             'user_type': 'student',
@@ -53,7 +55,7 @@ def get_user_profile(request):
             'gpa': student.gpa,
         })
     else:
-        user_data['user_type'] = 'admin'
+        user_data['user_type'] = role.user_type
 
     return Response(user_data)
 
@@ -64,18 +66,13 @@ def register_student_jwt(request):
     Register a new student and return JWT tokens
     """
     from .serializers import StudentRegistrationSerializer
-    from rest_framework_simplejwt.tokens import RefreshToken
 
     serializer = StudentRegistrationSerializer(data=request.data)
     if serializer.is_valid():
         student = serializer.save()
 
         # Generate JWT tokens for the new user
-        refresh = RefreshToken.for_user(student.user)
-        refresh['user_type'] = 'student'
-        refresh['profile_id'] = student.id
-        refresh['first_name'] = student.first_name
-        refresh['last_name'] = student.last_name
+        refresh = CustomTokenObtainPairSerializer.get_token(student.user)
 
         return Response({
             'message': 'Student registered successfully',
@@ -97,18 +94,13 @@ def register_teacher_jwt(request):
     Register a new teacher and return JWT tokens
     """
     from teachers.serializers import TeacherRegistrationSerializer
-    from rest_framework_simplejwt.tokens import RefreshToken
 
     serializer = TeacherRegistrationSerializer(data=request.data)
     if serializer.is_valid():
         teacher = serializer.save()
 
         # Generate JWT tokens for the new user
-        refresh = RefreshToken.for_user(teacher.user)
-        refresh['user_type'] = 'teacher'
-        refresh['profile_id'] = teacher.id
-        refresh['first_name'] = teacher.first_name
-        refresh['last_name'] = teacher.last_name
+        refresh = CustomTokenObtainPairSerializer.get_token(teacher.user)
 
         return Response({
             'message': 'Teacher registered successfully',
@@ -0,0 +1,56 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_test_environment, teardown_test_environment
+from benchmark import ENDPOINT_NAMES, BenchmarkSetupError, compare, run_benchmarks
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the hot REST and template endpoints in-process and report JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50, help='Timed requests per endpoint (default: 50)')
+        parser.add_argument('--warmup', type=int, default=5, help='Untimed requests per endpoint first (default: 5)')
+        parser.add_argument('--only', nargs='+', choices=ENDPOINT_NAMES, help='Benchmark just these endpoints')
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+        parser.add_argument('--baseline', help='Compare against an earlier JSON report; fails on regressions')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='Allowed p50 growth against the baseline, as a fraction (default: 0.2)')
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError('--iterations must be at least 1.')
+
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as baseline_file:
+                baseline = json.load(baseline_file)
+
+        # Lets the test client through ALLOWED_HOSTS and keeps emails in memory
+        try:
+            setup_test_environment(debug=False)
+            owns_environment = True
+        except RuntimeError:
+            # Already set up (running inside the test suite)
+            owns_environment = False
+        try:
+            report = run_benchmarks(options['only'], options['iterations'], options['warmup'])
+        except BenchmarkSetupError as e:
+            raise CommandError(str(e))
+        finally:
+            if owns_environment:
+                teardown_test_environment()
+
+        if baseline is not None:
+            report['comparison'] = compare(report, baseline, options['tolerance'])
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output_file:
+                output_file.write(output + '\n')
+            self.stderr.write(f'Benchmark report written to {options["output"]}')
+        else:
+            self.stdout.write(output)
+
+        regressed = sorted(name for name, entry in report.get('comparison', {}).items() if entry['regressed'])
+        if regressed:
+            raise CommandError(f'Regressed against the baseline: {", ".join(regressed)}')
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand, CommandError
+from mongo_config import mongo_connection
+
+
+class Command(BaseCommand):
+    help = 'Create the MongoDB indexes used by activity and notification logs'
+
+    def handle(self, *args, **options):
+        if not mongo_connection.create_indexes():
+            raise CommandError('MongoDB is not reachable - indexes were not created.')
+        self.stdout.write(self.style.SUCCESS(f'MongoDB indexes ready on {mongo_connection.db.name}.'))
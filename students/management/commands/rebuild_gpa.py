@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max, Min
+from students.models import Student
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the stored GPA, total credits and total grade points for every student'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Number of student ids rebuilt per UPDATE (default: 5000)')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        bounds = Student.objects.aggregate(low=Min('pk'), high=Max('pk'))
+        if bounds['low'] is None:
+            self.stdout.write('No students to rebuild.')
+            return
+
+        rebuilt = 0
+        for start in range(bounds['low'], bounds['high'] + 1, batch_size):
+            # Short transactions per id range keep row locks brief on large tables
+            with transaction.atomic():
+                rebuilt += Student.objects.filter(
+                    pk__gte=start, pk__lt=start + batch_size
+                ).rebuild_gpa()
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt GPA for {rebuilt} student(s).'))
@@ -0,0 +1,139 @@
+import random
+import time
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from courses.models import Course
+from students.models import Student, Enrollment, EnrollmentRequest
+from teachers.models import Teacher
+
+FIRST_NAMES = ['Ada', 'Ben', 'Chen', 'Dana', 'Eli', 'Fatima', 'Gus', 'Hana', 'Ivan', 'Jada',
+               'Kofi', 'Lena', 'Mateo', 'Nia', 'Omar', 'Priya', 'Quinn', 'Rosa', 'Sam', 'Tara']
+LAST_NAMES = ['Garcia', 'Smith', 'Nguyen', 'Okafor', 'Kim', 'Novak', 'Rossi', 'Haddad', 'Silva',
+              'Cohen', 'Ito', 'Muller', 'Patel', 'Jones', 'Dubois', 'Larsen', 'Reyes', 'Ali']
+SUBJECTS = ['Mathematics', 'Physics', 'Chemistry', 'Biology', 'Computer Science', 'History',
+            'Literature', 'Economics']
+
+
+class Command(BaseCommand):
+    help = 'Generate a large synthetic dataset of teachers, courses, students, enrollments and requests'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=1000, help='Students to create (default: 1000)')
+        parser.add_argument('--teachers', type=int, default=50, help='Teachers to create (default: 50)')
+        parser.add_argument('--courses', type=int, default=200, help='Courses to create (default: 200)')
+        parser.add_argument('--enrollments-per-student', type=int, default=4,
+                            help='Courses each student is enrolled in, while seats last (default: 4)')
+        parser.add_argument('--requests-per-student', type=float, default=0.5,
+                            help='Average open enrollment requests per student (default: 0.5)')
+        parser.add_argument('--graded', type=float, default=0.7,
+                            help='Fraction of enrollments that have a grade (default: 0.7)')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed (default: 42)')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Students written per transaction (default: 5000)')
+        parser.add_argument('--prefix', default='seed',
+                            help='Prefix for usernames and course codes (default: seed)')
+        parser.add_argument('--password', default='password123',
+                            help='Password for every generated user, hashed once (default: password123)')
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        if User.objects.filter(username__startswith=f'{prefix}_').exists():
+            raise CommandError(f'Users prefixed "{prefix}_" already exist - pick another --prefix.')
+
+        started = time.monotonic()
+        self.rng = random.Random(options['seed'])
+        self.graded = options['graded']
+        # One hash for everyone - hashing per user would dominate the run time
+        self.password = make_password(options['password'])
+
+        courses = self._create_courses(prefix, options['courses'], options['teachers'])
+        self.seats = {course.pk: course.openings for course in courses}
+
+        created = {'students': 0, 'enrollments': 0, 'requests': 0}
+        batch_size = options['batch_size']
+        for start in range(0, options['students'], batch_size):
+            count = min(batch_size, options['students'] - start)
+            with transaction.atomic():
+                batch = self._create_students(prefix, start, count, courses, options)
+            for key, value in batch.items():
+                created[key] += value
+            self.stdout.write(f'{created["students"]} / {options["students"]} students')
+
+        # Enrollments and requests were bulk inserted, so recount the stored counters once
+        Course.objects.filter(pk__in=self.seats).sync_enrolled_counts()
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {options["teachers"]} teachers, {len(courses)} courses, {created["students"]} students, '
+            f'{created["enrollments"]} enrollments and {created["requests"]} requests '
+            f'in {time.monotonic() - started:.1f}s.'))
+
+    def _create_courses(self, prefix, course_count, teacher_count):
+        rng = self.rng
+        with transaction.atomic():
+            users = User.objects.bulk_create([
+                User(username=f'{prefix}_teacher{i}', email=f'{prefix}_teacher{i}@example.com', password=self.password)
+                for i in range(teacher_count)
+            ])
+            teachers = Teacher.objects.bulk_create([
+                Teacher(user=user, first_name=rng.choice(FIRST_NAMES), last_name=rng.choice(LAST_NAMES),
+                        subject=rng.choice(SUBJECTS))
+                for user in users
+            ])
+            courses = Course.objects.bulk_create([
+                Course(name=f'{rng.choice(SUBJECTS)} {100 + i}', code=f'{prefix.upper()}{i:05d}',
+                       credits=rng.randint(1, 4), openings=rng.choice([20, 30, 50, 100, 200]))
+                for i in range(course_count)
+            ])
+            if teachers:
+                Teacher.courses.through.objects.bulk_create([
+                    Teacher.courses.through(teacher=teacher, course=course)
+                    for course in courses
+                    for teacher in rng.sample(teachers, min(len(teachers), rng.choice([1, 1, 2])))
+                ])
+        return courses
+
+    def _create_students(self, prefix, start, count, courses, options):
+        rng = self.rng
+        users = User.objects.bulk_create([
+            User(username=f'{prefix}_student{i}', email=f'{prefix}_student{i}@example.com', password=self.password)
+            for i in range(start, start + count)
+        ])
+        students = Student.objects.bulk_create([
+            Student(user=user, first_name=rng.choice(FIRST_NAMES), last_name=rng.choice(LAST_NAMES),
+                    age=rng.randint(17, 30))
+            for user in users
+        ])
+
+        enrollments = []
+        requests = []
+        per_student = min(options['enrollments_per_student'], len(courses))
+        for student in students:
+            enrolled = set()
+            for course in rng.sample(courses, per_student):
+                if self.seats[course.pk] > 0:
+                    self.seats[course.pk] -= 1
+                    enrolled.add(course.pk)
+                    enrollments.append(Enrollment(student=student, course=course, grade=self._grade()))
+
+            open_requests = int(options['requests_per_student'])
+            if rng.random() < options['requests_per_student'] - open_requests:
+                open_requests += 1
+            for course in rng.sample(courses, min(open_requests, len(courses))):
+                if course.pk in enrolled:
+                    continue
+                requests.append(EnrollmentRequest(
+                    student=student, course=course, priority=rng.randint(0, 5),
+                    status='pending' if self.seats[course.pk] > 0 else 'waitlisted',
+                ))
+
+        Enrollment.objects.bulk_create(enrollments, batch_size=options['batch_size'])
+        EnrollmentRequest.objects.bulk_create(requests, batch_size=options['batch_size'])
+        Student.objects.filter(pk__in=[student.pk for student in students]).rebuild_gpa()
+        return {'students': len(students), 'enrollments': len(enrollments), 'requests': len(requests)}
+
+    def _grade(self):
+        """Roughly normal grades around a B-, or None for enrollments still in progress"""
+        if self.rng.random() >= self.graded:
+            return None
+        return round(min(100.0, max(0.0, self.rng.gauss(78, 12))), 1)
@@ -0,0 +1,34 @@
+import time
+from django.core.management.base import BaseCommand
+from students.outbox import deliver_batch
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued enrollment notification emails from the outbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help='Emails sent per SMTP connection (default: 100)')
+        parser.add_argument('--max-attempts', type=int, default=5,
+                            help='Attempts before an email is marked failed (default: 5)')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep polling the outbox instead of exiting once it is drained')
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help='Seconds to sleep between polls when idle with --loop (default: 5)')
+
+    def handle(self, *args, **options):
+        total_sent = total_failed = 0
+
+        while True:
+            sent, failed = deliver_batch(options['batch_size'], options['max_attempts'])
+            total_sent += sent
+            total_failed += failed
+            if sent or failed:
+                self.stdout.write(f'Sent {sent}, failed {failed}')
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Outbox drained: {total_sent} sent, {total_failed} failed attempt(s).'))
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:13
+
+from django.db import migrations, models
+from django.db.models import Case, F, FloatField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Round
+
+
+def backfill_gpa_totals(apps, schema_editor):
+    """Populate the stored GPA totals from existing graded enrollments"""
+    Student = apps.get_model('students', 'Student')
+    Enrollment = apps.get_model('students', 'Enrollment')
+
+    grade_point = Case(
+        When(grade__gte=90, then=Value(4.0)),
+        When(grade__gte=80, then=Value(3.0)),
+        When(grade__gte=70, then=Value(2.0)),
+        When(grade__gte=60, then=Value(1.0)),
+        default=Value(0.0),
+        output_field=FloatField(),
+    )
+    graded = Enrollment.objects.filter(
+        student=OuterRef('pk'), grade__isnull=False
+    ).order_by().values('student')
+
+    Student.objects.update(
+        total_credits=Coalesce(Subquery(graded.annotate(total=Sum('course__credits')).values('total')), 0),
+        total_grade_points=Coalesce(Subquery(
+            graded.annotate(total=Sum(grade_point * F('course__credits'))).values('total')
+        ), 0.0),
+    )
+    Student.objects.filter(total_credits__gt=0).update(
+        gpa=Round(F('total_grade_points') / F('total_credits'), 2)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0006_convert_grades_to_numeric'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='student',
+            name='gpa',
+            field=models.FloatField(default=0.0, editable=False, help_text='Credit-weighted GPA, maintained from graded enrollments'),
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='total_credits',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='total_grade_points',
+            field=models.FloatField(default=0.0, editable=False),
+        ),
+        migrations.RunPython(backfill_gpa_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-17 08:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0004_course_enrolled_count'),
+        ('students', '0008_outboxemail'),
+        ('teachers', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['course', '-enrollment_date'], name='students_enr_course_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='enrollmentrequest',
+            index=models.Index(condition=models.Q(('status__in', ['pending', 'waitlisted'])), fields=['course', '-requested_at'], name='students_er_open_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='enrollmentrequest',
+            index=models.Index(condition=models.Q(('status', 'waitlisted')), fields=['course', '-priority', 'requested_at'], name='students_er_waitlist_idx'),
+        ),
+    ]
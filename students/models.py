@@ -1,41 +1,124 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, F, FloatField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Round
+from django.db.models.lookups import GreaterThan
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 from teachers.models import Teacher
-from django.core.mail import send_mail
+from courses.models import Course
 from django.conf import settings
 
 
+# Minimum numeric grade for each letter; anything below the last cutoff is an F
+GRADE_CUTOFFS = [(90, 'A'), (80, 'B'), (70, 'C'), (60, 'D')]
+
+GRADE_POINTS = {
+    'A': 4.0,
+    'B': 3.0,
+    'C': 2.0,
+    'D': 1.0,
+    'F': 0.0
+}
+
+
+def letter_grade_for(grade):
+    """Convert a numeric grade to its letter grade"""
+    if grade is None:
+        return None
+
+    for cutoff, letter in GRADE_CUTOFFS:
+        if grade >= cutoff:
+            return letter
+    return 'F'
+
+
+def grade_point_case(prefix=''):
+    """SQL CASE expression mapping a numeric grade column to its grade point"""
+    whens = [
+        When(**{f'{prefix}grade__gte': cutoff}, then=Value(GRADE_POINTS[letter]))
+        for cutoff, letter in GRADE_CUTOFFS
+    ]
+    whens.append(When(**{f'{prefix}grade__isnull': False}, then=Value(GRADE_POINTS['F'])))
+    return Case(*whens, default=None, output_field=FloatField())
+
+
+def gpa_from_totals(points, credits):
+    """SQL expression for a rounded GPA, 0.0 when there are no graded credits"""
+    return Case(
+        When(GreaterThan(credits, 0), then=Round(points / credits, 2)),
+        default=Value(0.0),
+        output_field=FloatField(),
+    )
+
+
+def gpa_aggregate(prefix=''):
+    """Aggregate computing the credit-weighted GPA over the enrollments reached through prefix"""
+    credits_field = f'{prefix}course__credits'
+    points = Sum(grade_point_case(prefix) * F(credits_field))
+    credits = Sum(credits_field, filter=Q(**{f'{prefix}grade__isnull': False}))
+    return gpa_from_totals(points, credits)
+
+
+class StudentQuerySet(models.QuerySet):
+    def with_gpa(self):
+        """Annotate computed_gpa, calculated from enrollments in the same SQL statement
+
+        Don't combine with other aggregates over enrollments - the join would double count.
+        """
+        return self.annotate(computed_gpa=gpa_aggregate('enrollments__'))
+
+    def adjust_gpa_totals(self, credits, points):
+        """Shift the stored GPA totals by a delta and recompute gpa in the same UPDATE"""
+        return self.update(
+            total_credits=F('total_credits') + credits,
+            total_grade_points=F('total_grade_points') + points,
+            gpa=gpa_from_totals(F('total_grade_points') + points, F('total_credits') + credits),
+        )
+
+    def rebuild_gpa(self):
+        """Recompute the stored GPA totals from graded enrollments"""
+        graded = Enrollment.objects.filter(
+            student=OuterRef('pk'), grade__isnull=False
+        ).order_by().values('student')
+        credits = graded.annotate(total=Sum('course__credits')).values('total')
+        points = graded.annotate(
+            total=Sum(grade_point_case() * F('course__credits'))
+        ).values('total')
+
+        updated = self.update(
+            total_credits=Coalesce(Subquery(credits), 0),
+            total_grade_points=Coalesce(Subquery(points), 0.0),
+        )
+        self.update(gpa=gpa_from_totals(F('total_grade_points'), F('total_credits')))
+        return updated
+
+
 class Student(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='student_profile')
     first_name = models.CharField(max_length=50)
     last_name = models.CharField(max_length=50)
     age = models.IntegerField()
     enrolled_courses = models.ManyToManyField('courses.Course', through='Enrollment', related_name='students')
+    gpa = models.FloatField(default=0.0, editable=False,
+                            help_text="Credit-weighted GPA, maintained from graded enrollments")
+    total_credits = models.IntegerField(default=0, editable=False)
+    total_grade_points = models.FloatField(default=0.0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
-    @property
-    def gpa(self):
-        """Calculate GPA based on letter grades in enrolled courses"""
-        graded_enrollments = self.enrollments.exclude(grade__isnull=True)
-
-        if not graded_enrollments.exists():
-            return 0.0
-
-        total_points = 0
-        total_credits = 0
-
-        for enrollment in graded_enrollments:
-            grade_point = enrollment.grade_point
-            if grade_point is not None:
-                total_points += grade_point * enrollment.course.credits
-                total_credits += enrollment.course.credits
+    objects = StudentQuerySet.as_manager()
 
-        if total_credits == 0:
-            return 0.0
+    # Only ever changed through F() updates and rebuild_gpa()
+    MAINTAINED_FIELDS = ('gpa', 'total_credits', 'total_grade_points')
 
-        return round(total_points / total_credits, 2)
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            # Never write back a stale in-memory copy of the GPA totals
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.MAINTAINED_FIELDS
+            ]
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f'Student: {self.first_name} {self.last_name}'
@@ -52,41 +135,39 @@ class Enrollment(models.Model):
     class Meta:
         unique_together = ['student', 'course']
         ordering = ['-enrollment_date']
+        indexes = [
+            # A course's roster, newest first (course pages, exports, manage course)
+            models.Index(fields=['course', '-enrollment_date'], name='students_enr_course_date_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what was loaded so save() can apply GPA deltas instead of recounting
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
 
     @property
     def letter_grade(self):
         """Convert numeric grade to letter grade"""
-        if self.grade is None:
-            return None
-        
-        if self.grade >= 90:
-            return 'A'
-        elif self.grade >= 80:
-            return 'B'
-        elif self.grade >= 70:
-            return 'C'
-        elif self.grade >= 60:
-            return 'D'
-        else:
-            return 'F'
-    
+        return letter_grade_for(self.grade)
+
     @property
     def grade_point(self):
         """Convert letter grade to grade point for GPA calculation"""
         letter = self.letter_grade
-        
+
         if letter is None:
             return None
-        
-        grade_points = {
-            'A': 4.0,
-            'B': 3.0,
-            'C': 2.0,
-            'D': 1.0,
-            'F': 0.0
-        }
-        
-        return grade_points.get(letter, None)
+
+        return GRADE_POINTS.get(letter, None)
+
+    def gpa_contribution(self, grade):
+        """(credits, grade points) an enrollment with this grade adds to the student's GPA totals"""
+        if grade is None:
+            return 0, 0.0
+        credits = self.course.credits
+        return credits, GRADE_POINTS[letter_grade_for(grade)] * credits
 
     def clean(self):
         if self.course.is_full and not self.pk:  # Only check for new enrollments
@@ -101,7 +182,51 @@ class Enrollment(models.Model):
 
     def save(self, *args, **kwargs):
         self.clean()
-        super().save(*args, **kwargs)
+        adding = self._state.adding
+        loaded = getattr(self, '_loaded_values', {})
+        update_fields = kwargs.get('update_fields')
+
+        with transaction.atomic():
+            self._sync_course_seats(adding, loaded)
+            super().save(*args, **kwargs)
+            if update_fields is None or 'grade' in update_fields:
+                self._sync_student_gpa(adding, loaded)
+
+        self._loaded_values = {
+            'student_id': self.student_id,
+            'course_id': self.course_id,
+            'grade': self.grade,
+        }
+
+    def _sync_course_seats(self, adding, loaded):
+        """Reserve a seat for a new (or moved) enrollment with a guarded UPDATE on the course"""
+        moved = not adding and loaded.get('course_id', self.course_id) != self.course_id
+        if not (adding or moved):
+            return
+
+        if not self.course.reserve_seat():
+            raise ValidationError(f'Course {self.course.code} is full ({self.course.openings} students)')
+        if moved:
+            Course.objects.filter(pk=loaded['course_id']).release_seats()
+
+    def _sync_student_gpa(self, adding, loaded):
+        """Apply this save's change in credits/grade points to the stored student GPA"""
+        if adding:
+            old_credits, old_points = 0, 0.0
+        elif (loaded.get('student_id') == self.student_id
+              and loaded.get('course_id') == self.course_id and 'grade' in loaded):
+            old_credits, old_points = self.gpa_contribution(loaded['grade'])
+        else:
+            # Moved between students/courses or loaded without the grade - recount
+            student_ids = {self.student_id, loaded.get('student_id', self.student_id)}
+            Student.objects.filter(pk__in=student_ids).rebuild_gpa()
+            return
+
+        new_credits, new_points = self.gpa_contribution(self.grade)
+        if (new_credits, new_points) != (old_credits, old_points):
+            Student.objects.filter(pk=self.student_id).adjust_gpa_totals(
+                new_credits - old_credits, new_points - old_points
+            )
 
     def __str__(self):
         return f'{self.student} enrolled in {self.course}'
@@ -129,6 +254,15 @@ class EnrollmentRequest(models.Model):
     class Meta:
         unique_together = ['student', 'course']
         ordering = ['-priority', '-requested_at']
+        indexes = [
+            # Open requests per course, newest first (dashboards, pending_requests); closed
+            # requests pile up over time and are left out of the index
+            models.Index(fields=['course', '-requested_at'], name='students_er_open_idx',
+                         condition=Q(status__in=['pending', 'waitlisted'])),
+            # process_waitlist: a course's waitlist in promotion order
+            models.Index(fields=['course', '-priority', 'requested_at'], name='students_er_waitlist_idx',
+                         condition=Q(status='waitlisted')),
+        ]
 
     def clean(self):
         if self.enrollment_deadline and timezone.now() > self.enrollment_deadline:
@@ -160,29 +294,29 @@ class EnrollmentRequest(models.Model):
         super().save(*args, **kwargs)
 
     def approve(self, teacher):
-        if self.course.is_full:
-            raise ValidationError(
-                f'Cannot approve - course is full ({self.course.enrolled_students}/{self.course.openings})')
+        from .services import enroll_student
 
-        # Create enrollment
-        enrollment = Enrollment.objects.create(
-            student=self.student,
-            course=self.course,
-            enrolled_by=teacher
-        )
+        def mark_approved(enrollment):
+            self.status = 'approved'
+            self.reviewed_by = teacher
+            self.reviewed_at = timezone.now()
+            self.save()
+            # Queue approval email - delivered by the send_outbox_emails worker
+            self._queue_email(self.approval_email())
 
-        self.status = 'approved'
-        self.reviewed_by = teacher
-        self.reviewed_at = timezone.now()
-        self.save()
+        # Seat reservation, status change and email commit together under the course row lock
+        enrollment = enroll_student(self.student, self.course, enrolled_by=teacher, on_enrolled=mark_approved)
 
-        # Send approval email
-        student_email = self.student.user.email
-        if student_email:
-            try:
-                send_mail(
-                    subject=f'Enrollment Approved - {self.course.code}',
-                    message=f'''Dear {self.student.first_name},
+        # Process waitlist after successful enrollment
+        self.course.process_waitlist()
+
+        return enrollment
+
+    def approval_email(self):
+        """(subject, message, from_email, recipient_list) telling the student they are enrolled"""
+        return (
+            f'Enrollment Approved - {self.course.code}',
+            f'''Dear {self.student.first_name},
 
 Your enrollment request for {self.course.code} - {self.course.name} has been approved.
 
@@ -191,20 +325,9 @@ You are now enrolled in this course.
 Best regards,
 Academic Office
 ''',
-                    from_email=settings.DEFAULT_FROM_EMAIL,
-                    recipient_list=[student_email],
-                    fail_silently=False,
-                )
-                print(f"Approval email sent to {student_email}")
-            except Exception as e:
-                print(f"Failed to send approval email to {student_email}: {e}")
-        else:
-            print(f"No email address for student {self.student.first_name} {self.student.last_name}")
-
-        # Process waitlist after successful enrollment
-        self.course.process_waitlist()
-
-        return enrollment
+            settings.DEFAULT_FROM_EMAIL,
+            [self.student.user.email],
+        )
 
     def reject(self, teacher, reason=''):
         self.status = 'rejected'
@@ -212,15 +335,17 @@ Academic Office
         self.reviewed_at = timezone.now()
         if reason:
             self.notes = reason
-        self.save()
 
-        # Send rejection email
-        student_email = self.student.user.email
-        if student_email:
-            try:
-                send_mail(
-                    subject=f'Enrollment Request rejected - {self.course.code}',
-                    message=f'''Dear {self.student.first_name},
+        with transaction.atomic():
+            self.save()
+            # Queue rejection email - delivered by the send_outbox_emails worker
+            self._queue_email(self.rejection_email(reason))
+
+    def rejection_email(self, reason=''):
+        """(subject, message, from_email, recipient_list) explaining the request was rejected"""
+        return (
+            f'Enrollment Request rejected - {self.course.code}',
+            f'''Dear {self.student.first_name},
 
 Your enrollment request for {self.course.code} - {self.course.name} has been reviewed.
 
@@ -232,15 +357,59 @@ Please contact your academic advisor for assistance.
 Best regards,
 Academic Office
 ''',
-                    from_email=settings.DEFAULT_FROM_EMAIL,
-                    recipient_list=[student_email],
-                    fail_silently=False,
-                )
-                print(f"Rejection email sent to {student_email}")
-            except Exception as e:
-                print(f"Failed to send rejection email to {student_email}: {e}")
+            settings.DEFAULT_FROM_EMAIL,
+            [self.student.user.email],
+        )
+
+    def _queue_email(self, email):
+        if self.student.user.email:
+            OutboxEmail.enqueue(*email)
         else:
             print(f"No email address for student {self.student.first_name} {self.student.last_name}")
 
     def __str__(self):
         return f'{self.student} - {self.course} ({self.status})'
+
+
+class OutboxEmail(models.Model):
+    """Email waiting to be delivered by the send_outbox_emails worker"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    subject = models.CharField(max_length=255)
+    message = models.TextField()
+    from_email = models.CharField(max_length=254, blank=True)
+    recipient = models.EmailField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    # When a worker claimed the row for sending; a claim older than the worker's timeout is retaken
+    last_attempt_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [models.Index(fields=['status', 'next_attempt_at'])]
+
+    @classmethod
+    def enqueue(cls, subject, message, from_email, recipient_list):
+        """Queue one email per recipient; only inserts rows, never talks to SMTP"""
+        return cls.enqueue_many([(subject, message, from_email, recipient_list)])
+
+    @classmethod
+    def enqueue_many(cls, emails):
+        """Queue (subject, message, from_email, recipient_list) tuples with one bulk INSERT"""
+        return cls.objects.bulk_create([
+            cls(subject=subject, message=message, from_email=from_email or '', recipient=recipient)
+            for subject, message, from_email, recipient_list in emails
+            for recipient in recipient_list if recipient
+        ])
+
+    def __str__(self):
+        return f'{self.subject} -> {self.recipient} ({self.status})'
@@ -0,0 +1,92 @@
+# Delivery of queued OutboxEmail rows over a single reused SMTP connection
+from datetime import timedelta
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from activity_logger import ActivityLogger
+from .models import OutboxEmail
+
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 60 * 60
+# A claimed batch not finished within this long is assumed lost with its worker
+CLAIM_TIMEOUT_SECONDS = 10 * 60
+
+
+def retry_delay(attempts):
+    """Exponential backoff: 30s, 60s, 120s, ... capped at an hour"""
+    return timedelta(seconds=min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS))
+
+
+def claim_batch(batch_size=100):
+    """
+    Mark a batch of due emails as sending and return them, in a short transaction of its own
+
+    Rows are picked with SKIP LOCKED so several workers can drain the outbox at once. Rows
+    left 'sending' by a worker that died are retaken after CLAIM_TIMEOUT_SECONDS.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        batch = list(
+            OutboxEmail.objects.select_for_update(skip_locked=True)
+            .filter(Q(status='pending', next_attempt_at__lte=now)
+                    | Q(status='sending', last_attempt_at__lte=now - timedelta(seconds=CLAIM_TIMEOUT_SECONDS)))
+            .order_by('next_attempt_at')[:batch_size]
+        )
+        OutboxEmail.objects.filter(pk__in=[email.pk for email in batch]).update(
+            status='sending', last_attempt_at=now
+        )
+    return batch
+
+
+def deliver_batch(batch_size=100, max_attempts=5):
+    """
+    Send one batch of due emails and record each outcome
+
+    The batch is claimed and committed first, so no row lock or transaction is held
+    while talking to the mail server. Returns (sent, failed) counts for the batch.
+    """
+    batch = claim_batch(batch_size)
+    if not batch:
+        return 0, 0
+
+    sent = failed = 0
+    connection = get_connection()
+    try:
+        connection.open()
+        connection_error = None
+    except Exception as e:
+        connection_error = e
+
+    for email in batch:
+        try:
+            if connection_error:
+                raise connection_error
+            EmailMessage(email.subject, email.message, email.from_email or None, [email.recipient],
+                         connection=connection).send()
+            email.status = 'sent'
+            email.sent_at = timezone.now()
+            email.last_error = ''
+            sent += 1
+        except Exception as e:
+            email.attempts += 1
+            email.last_error = str(e)
+            if email.attempts >= max_attempts:
+                email.status = 'failed'
+            else:
+                email.status = 'pending'
+                email.next_attempt_at = timezone.now() + retry_delay(email.attempts)
+            failed += 1
+
+        ActivityLogger.log_notification(
+            recipient_email=email.recipient,
+            subject=email.subject,
+            message=email.message,
+            status=email.status if email.status != 'pending' else 'retrying'
+        )
+
+    connection.close()
+    OutboxEmail.objects.bulk_update(
+        batch, ['status', 'sent_at', 'attempts', 'last_error', 'next_attempt_at']
+    )
+    return sent, failed
@@ -6,7 +6,7 @@ from courses.serializers import CourseSerializer
 
 class StudentSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
-    gpa = serializers.FloatField(read_only=True)  # Calculated property, read-only
+    gpa = serializers.FloatField(read_only=True)  # Maintained from graded enrollments, read-only
 
     class Meta:
         model = Student
@@ -0,0 +1,210 @@
+# Enrollment service - the single transactional path that turns a student into an enrollment
+import time
+from collections import namedtuple
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, OperationalError, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from courses.models import Course
+from .models import Enrollment
+
+# PostgreSQL serialization_failure and deadlock_detected
+RETRYABLE_PGCODES = {'40001', '40P01'}
+MAX_RETRIES = 3
+RETRY_BACKOFF_SECONDS = 0.05
+
+
+class CourseFullError(ValidationError):
+    pass
+
+
+class AlreadyEnrolledError(ValidationError):
+    pass
+
+
+def _is_retryable(error):
+    return getattr(error.__cause__, 'pgcode', None) in RETRYABLE_PGCODES
+
+
+def run_with_retry(func, retries=MAX_RETRIES):
+    """Run func in its own transaction, retrying serialization failures and deadlocks
+
+    Inside an outer atomic block the transaction can't be restarted, so errors propagate.
+    """
+    can_retry = not transaction.get_connection().in_atomic_block
+    attempt = 0
+    while True:
+        try:
+            with transaction.atomic():
+                return func()
+        except OperationalError as e:
+            if not can_retry or attempt >= retries or not _is_retryable(e):
+                raise
+            time.sleep(RETRY_BACKOFF_SECONDS * 2 ** attempt)
+            attempt += 1
+
+
+def enroll_student(student, course, enrolled_by=None, enrollment_deadline=None, on_enrolled=None):
+    """
+    Enroll a student with the course row locked for the whole check-then-insert
+
+    on_enrolled(enrollment) runs inside the same transaction, so callers can record
+    related state (e.g. approve a request) that commits or rolls back with the seat.
+    Raises CourseFullError or AlreadyEnrolledError.
+    """
+    def enroll():
+        locked = Course.objects.select_for_update().get(pk=course.pk)
+        course.enrolled_count = locked.enrolled_count
+
+        if Enrollment.objects.filter(student=student, course=locked).exists():
+            raise AlreadyEnrolledError(f'Student is already enrolled in {locked.code}')
+        if locked.is_full:
+            raise CourseFullError(
+                f'Course {locked.code} is full ({locked.enrolled_students}/{locked.openings})')
+
+        try:
+            # Enrollment.save() runs in its own savepoint, so a failed insert leaves this
+            # transaction usable without wrapping it in another one
+            enrollment = Enrollment.objects.create(
+                student=student,
+                course=locked,
+                enrolled_by=enrolled_by,
+                enrollment_deadline=enrollment_deadline
+            )
+        except IntegrityError:
+            # Lost a race on unique_together with a concurrent insert for the same student
+            raise AlreadyEnrolledError(f'Student is already enrolled in {locked.code}')
+
+        course.enrolled_count = locked.enrolled_count
+        if on_enrolled:
+            on_enrolled(enrollment)
+        return enrollment
+
+    return run_with_retry(enroll)
+
+
+# outcomes maps request id -> outcome, by_course maps course code -> {outcome: count}
+BulkReview = namedtuple('BulkReview', ['outcomes', 'by_course'])
+
+
+def _summarize(reviewed):
+    """BulkReview from (request, outcome) pairs; by_course counts outcomes per course code"""
+    outcomes = {}
+    by_course = {}
+    for request, outcome in reviewed:
+        outcomes[request.pk] = outcome
+        counts = by_course.setdefault(request.course.code, {})
+        counts[outcome] = counts.get(outcome, 0) + 1
+    return BulkReview(outcomes, by_course)
+
+
+def bulk_approve_requests(request_ids, teacher=None):
+    """
+    Approve many pending/waitlisted requests with set-based writes; returns a BulkReview
+
+    The requests' courses are locked once, before the requests are read. Each course's free
+    seats go to its requests by priority, then request time; the rest are waitlisted.
+    Enrollments are bulk inserted, statuses changed with one UPDATE per outcome and
+    the approval emails queued in one INSERT. Requests whose student is already
+    enrolled are left untouched and reported as 'already_enrolled'.
+    """
+    from .models import EnrollmentRequest, OutboxEmail
+    from activity_logger import ActivityLogger
+
+    def approve():
+        # Lock first, in primary key order so concurrent bulk reviews can't deadlock; reading
+        # the requests only once the locks are held means an approval or enrollment that
+        # committed in the meantime is seen rather than hit as a unique violation on insert
+        course_ids = EnrollmentRequest.objects.filter(pk__in=request_ids).values('course_id')
+        courses = {
+            course.pk: course for course in
+            Course.objects.select_for_update().filter(pk__in=course_ids).order_by('pk')
+        }
+        already_enrolled = Enrollment.objects.filter(student=OuterRef('student'), course=OuterRef('course'))
+        pending = list(
+            EnrollmentRequest.objects.filter(pk__in=request_ids, status__in=['pending', 'waitlisted'])
+            .annotate(already_enrolled=Exists(already_enrolled))
+            .select_related('student__user')
+            .order_by('-priority', 'requested_at')
+        )
+        free_seats = {pk: course.available_spots for pk, course in courses.items()}
+
+        reviewed = []
+        for request in pending:
+            request.course = courses[request.course_id]
+            if request.already_enrolled:
+                reviewed.append((request, 'already_enrolled'))
+            elif free_seats[request.course_id] > 0:
+                free_seats[request.course_id] -= 1
+                reviewed.append((request, 'approved'))
+            else:
+                reviewed.append((request, 'waitlisted'))
+
+        approved = [request for request, outcome in reviewed if outcome == 'approved']
+        waitlisted = [request for request, outcome in reviewed if outcome == 'waitlisted']
+
+        # Enrollment.save() is bypassed, so take each course's seats in one guarded UPDATE;
+        # a stored counter that disagrees matches nothing and rolls the whole batch back
+        for pk, course in courses.items():
+            taken = course.available_spots - free_seats[pk]
+            if taken:
+                if not Course.objects.filter(pk=pk).reserve_seats(taken):
+                    raise CourseFullError(f'Course {course.code} is full ({course.enrolled_count}/{course.openings})')
+                course.enrolled_count += taken
+        Enrollment.objects.bulk_create([
+            Enrollment(student=request.student, course=request.course, enrolled_by=teacher)
+            for request in approved
+        ])
+
+        reviewed_at = timezone.now()
+        EnrollmentRequest.objects.filter(pk__in=[request.pk for request in approved]).update(
+            status='approved', reviewed_by=teacher, reviewed_at=reviewed_at
+        )
+        EnrollmentRequest.objects.filter(pk__in=[request.pk for request in waitlisted]).exclude(
+            status='waitlisted'
+        ).update(status='waitlisted', notes='Waitlisted - course at capacity')
+        for request in approved:
+            request.status, request.reviewed_by, request.reviewed_at = 'approved', teacher, reviewed_at
+
+        OutboxEmail.enqueue_many(request.approval_email() for request in approved)
+        transaction.on_commit(lambda: ActivityLogger.log_enrollment_requests(approved, 'approved', teacher))
+        return reviewed
+
+    return _summarize(run_with_retry(approve))
+
+
+def bulk_reject_requests(request_ids, teacher=None, reason=''):
+    """
+    Reject many pending/waitlisted requests with one UPDATE and one batch of queued emails
+
+    Returns a BulkReview. Approved requests keep their enrollment and are reported as
+    'already_approved'; requests that were already rejected are left out.
+    """
+    from .models import EnrollmentRequest, OutboxEmail
+    from activity_logger import ActivityLogger
+
+    def reject():
+        # Row locks keep a concurrent approval from landing between the read and the UPDATE
+        found = list(
+            EnrollmentRequest.objects.filter(pk__in=request_ids, status__in=['pending', 'waitlisted', 'approved'])
+            .select_related('student__user', 'course')
+            .select_for_update(of=('self',))
+            .order_by('pk')
+        )
+        rejected = [request for request in found if request.status != 'approved']
+        reviewed_at = timezone.now()
+        changes = {'status': 'rejected', 'reviewed_by': teacher, 'reviewed_at': reviewed_at}
+        if reason:
+            changes['notes'] = reason
+        EnrollmentRequest.objects.filter(pk__in=[request.pk for request in rejected]).update(**changes)
+        for request in rejected:
+            for field, value in changes.items():
+                setattr(request, field, value)
+
+        OutboxEmail.enqueue_many(request.rejection_email(reason) for request in rejected)
+        transaction.on_commit(lambda: ActivityLogger.log_enrollment_requests(
+            rejected, 'rejected', teacher, reason=reason or None
+        ))
+        return [(request, 'already_approved' if request.status == 'approved' else 'rejected') for request in found]
+
+    return _summarize(run_with_retry(reject))
@@ -0,0 +1,52 @@
+# Signal handlers that keep denormalized student data in sync
+from django.contrib.auth.models import User
+from django.contrib.auth.signals import user_logged_in
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from courses.models import Course
+from courses.waitlist import schedule_waitlist_processing
+from user_roles import invalidate_user_role, remember_user_role
+from .models import Student, Enrollment
+
+
+@receiver(post_delete, sender=Enrollment)
+def remove_enrollment_from_gpa(sender, instance, **kwargs):
+    """Take a deleted enrollment's grade back out of the stored student GPA"""
+    if instance.grade is None:
+        return
+
+    credits, points = instance.gpa_contribution(instance.grade)
+    Student.objects.filter(pk=instance.student_id).adjust_gpa_totals(-credits, -points)
+
+
+@receiver(post_delete, sender=Enrollment)
+def release_enrollment_seat(sender, instance, **kwargs):
+    """Give a deleted enrollment's seat back to its course and offer it to the waitlist"""
+    Course.objects.filter(pk=instance.course_id).release_seats()
+    schedule_waitlist_processing(instance.course_id)
+
+
+@receiver(post_save, sender=Student)
+@receiver(post_delete, sender=Student)
+def invalidate_student_role(sender, instance, created=True, **kwargs):
+    """A new or deleted student profile changes the user's role claims"""
+    if created:
+        invalidate_user_role(instance.user_id, instance._state.fields_cache.get('user'))
+
+
+ADMIN_FLAGS = ('is_superuser', 'is_staff')
+
+
+@receiver(pre_save, sender=User)
+def invalidate_role_on_admin_change(sender, instance, update_fields=None, **kwargs):
+    """Granting or revoking superuser/staff changes the user's role claims"""
+    if instance.pk is None or (update_fields is not None and not set(ADMIN_FLAGS) & set(update_fields)):
+        return  # new users have no claims yet; login's last_login save skips the lookup
+    stored = User.objects.filter(pk=instance.pk).values_list(*ADMIN_FLAGS).first()
+    if stored is not None and stored != tuple(getattr(instance, flag) for flag in ADMIN_FLAGS):
+        invalidate_user_role(instance.pk, instance)
+
+
+@receiver(user_logged_in)
+def remember_role_on_login(sender, request, user, **kwargs):
+    remember_user_role(request, user)
@@ -0,0 +1,859 @@
+from django.test import TestCase, TransactionTestCase, RequestFactory, override_settings
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.utils import timezone
+from unittest import mock
+from django.db import connection
+from django.db.models import Count, F
+from io import StringIO
+from unittest import skipUnless
+import copy
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from activity_logger import BufferedActivityWriter
+from benchmark import compare
+from activity_spool import ActivitySpool
+from request_metrics import MongoCommandTimer, RequestMetricsMiddleware
+from django.http import HttpResponse
+from mongo_config import MongoDBConnection
+from pymongo.errors import ConnectionFailure
+from context_processors import user_type_processor
+from user_roles import get_user_role, get_user_type, get_request_role
+from students.jwt_authentication import RoleClaimsJWTAuthentication, ClaimsJWTAuthentication, full_user
+from django.test.utils import CaptureQueriesContext
+from students.jwt_serializers import CustomTokenObtainPairSerializer
+from teachers.models import Teacher
+from courses.models import Course
+from students.models import Student, Enrollment, EnrollmentRequest, OutboxEmail
+from students import views as student_views
+from students.outbox import CLAIM_TIMEOUT_SECONDS, deliver_batch
+from students.services import enroll_student, CourseFullError, bulk_approve_requests, bulk_reject_requests
+
+
+class StudentGpaTestCase(TestCase):
+    def setUp(self):
+        self.student = Student.objects.create(
+            user=User.objects.create_user(username='gpa1', email='gpa1@example.com', password='pass'),
+            first_name='Grace', last_name='Point', age=20
+        )
+        self.course3 = Course.objects.create(name='Databases', code='CS301', credits=3, openings=10)
+        self.course4 = Course.objects.create(name='Calculus', code='M201', credits=4, openings=10)
+
+    def test_gpa_follows_grade_changes(self):
+        e3 = Enrollment.objects.create(student=self.student, course=self.course3)
+        e4 = Enrollment.objects.create(student=self.student, course=self.course4)
+        self.student.refresh_from_db()
+        assert self.student.gpa == 0.0
+
+        e3.grade = 92  # A -> 4.0 x 3
+        e3.save()
+        e4 = Enrollment.objects.get(pk=e4.pk)
+        e4.grade = 85  # B -> 3.0 x 4
+        e4.save()
+        self.student.refresh_from_db()
+        assert self.student.total_credits == 7
+        assert self.student.total_grade_points == 24.0
+        assert self.student.gpa == 3.43
+
+        # Clearing a grade takes it out of the GPA
+        e4.grade = None
+        e4.save()
+        self.student.refresh_from_db()
+        assert self.student.total_credits == 3
+        assert self.student.gpa == 4.0
+
+        # Deleting a graded enrollment does the same
+        e3.delete()
+        self.student.refresh_from_db()
+        assert self.student.total_credits == 0
+        assert self.student.gpa == 0.0
+
+    def test_saving_a_stale_student_keeps_the_maintained_gpa(self):
+        enrollment = Enrollment.objects.create(student=self.student, course=self.course3)
+        stale = Student.objects.get(pk=self.student.pk)
+        enrollment.grade = 92
+        enrollment.save()
+
+        # update_student loaded its copy before the grade change committed
+        with mock.patch('students.views.get_object_or_404', return_value=stale):
+            resp = self.client.put(f'/api/students/students/{self.student.pk}/update/',
+                                   {'first_name': 'Gracie'}, content_type='application/json')
+        assert resp.status_code == 200, resp.content
+
+        self.student.refresh_from_db()
+        assert self.student.first_name == 'Gracie'
+        assert (self.student.total_credits, self.student.gpa) == (3, 4.0)
+
+    def test_course_credit_change_updates_gpa(self):
+        Enrollment.objects.create(student=self.student, course=self.course3, grade=95)
+        Enrollment.objects.create(student=self.student, course=self.course4, grade=55)
+        self.student.refresh_from_db()
+        assert self.student.gpa == round(12 / 7, 2)
+
+        course = Course.objects.get(pk=self.course4.pk)
+        course.credits = 1
+        course.save()
+        self.student.refresh_from_db()
+        assert self.student.total_credits == 4
+        assert self.student.gpa == 3.0
+
+    def test_rebuild_gpa_command(self):
+        Enrollment.objects.create(student=self.student, course=self.course3, grade=75)
+        Student.objects.update(gpa=0.0, total_credits=0, total_grade_points=0.0)
+
+        out = StringIO()
+        call_command('rebuild_gpa', batch_size=1, stdout=out)
+        self.student.refresh_from_db()
+        assert self.student.total_credits == 3
+        assert self.student.gpa == 2.0
+        assert 'Rebuilt GPA for 1 student' in out.getvalue()
+
+    def test_with_gpa_matches_stored_gpa(self):
+        Enrollment.objects.create(student=self.student, course=self.course3, grade=92)
+        Enrollment.objects.create(student=self.student, course=self.course4, grade=61)
+        Enrollment.objects.create(
+            student=Student.objects.create(
+                user=User.objects.create_user(username='gpa2', email='gpa2@example.com', password='pass'),
+                first_name='No', last_name='Grades', age=19
+            ),
+            course=self.course3
+        )
+
+        with self.assertNumQueries(1):
+            annotated = {s.id: s.computed_gpa for s in Student.objects.with_gpa()}
+        stored = dict(Student.objects.values_list('id', 'gpa'))
+        assert annotated == stored
+        assert annotated[self.student.id] == round((4.0 * 3 + 1.0 * 4) / 7, 2)
+
+    def test_student_list_uses_one_query(self):
+        Enrollment.objects.create(student=self.student, course=self.course3, grade=82)
+        with self.assertNumQueries(1):
+            resp = student_views.student_list(RequestFactory().get('/students/'))
+        data = json.loads(resp.content.decode())
+        assert data[0]['gpa'] == 3.0
+
+
+class EmailOutboxTestCase(TestCase):
+    def setUp(self):
+        self.student = Student.objects.create(
+            user=User.objects.create_user(username='mail1', email='mail1@example.com', password='pass'),
+            first_name='Mae', last_name='Ling', age=20
+        )
+        self.course = Course.objects.create(name='Distributed Systems', code='CS550', credits=3, openings=5)
+
+    def test_approve_and_reject_only_queue_emails(self):
+        request = EnrollmentRequest.objects.create(student=self.student, course=self.course)
+        request.approve(teacher=None)
+        other = Course.objects.create(name='Security', code='CS560', credits=3, openings=5)
+        EnrollmentRequest.objects.create(student=self.student, course=other).reject(teacher=None, reason='Full')
+
+        assert len(mail.outbox) == 0
+        subjects = list(OutboxEmail.objects.values_list('subject', flat=True))
+        assert subjects == ['Enrollment Approved - CS550', 'Enrollment Request rejected - CS560']
+
+    def test_worker_sends_batch_over_one_connection(self):
+        OutboxEmail.enqueue_many([
+            (f'Subject {i}', 'Body', 'office@example.com', [f'to{i}@example.com']) for i in range(3)
+        ])
+        with mock.patch('students.outbox.get_connection', wraps=mail.get_connection) as get_connection:
+            call_command('send_outbox_emails', stdout=StringIO())
+
+        assert get_connection.call_count == 1
+        assert len(mail.outbox) == 3
+        assert OutboxEmail.objects.filter(status='sent', sent_at__isnull=False).count() == 3
+
+    def test_batch_is_claimed_before_sending_outside_any_transaction(self):
+        email = OutboxEmail.enqueue('Subject', 'Body', 'office@example.com', ['to@example.com'])[0]
+        outer_blocks = len(connection.atomic_blocks)
+        seen = []
+
+        def send(message):
+            seen.append((len(connection.atomic_blocks), OutboxEmail.objects.values_list('status', flat=True).get()))
+            return 1
+
+        with mock.patch('django.core.mail.EmailMessage.send', autospec=True, side_effect=send):
+            assert deliver_batch() == (1, 0)
+        assert seen == [(outer_blocks, 'sending')]
+        email.refresh_from_db()
+        assert email.status == 'sent' and email.last_attempt_at is not None
+
+    def test_claim_left_by_a_dead_worker_is_retaken(self):
+        email = OutboxEmail.enqueue('Subject', 'Body', 'office@example.com', ['to@example.com'])[0]
+        OutboxEmail.objects.update(status='sending', last_attempt_at=timezone.now())
+        assert deliver_batch() == (0, 0)
+
+        OutboxEmail.objects.update(last_attempt_at=timezone.now() - timedelta(seconds=CLAIM_TIMEOUT_SECONDS + 1))
+        assert deliver_batch() == (1, 0)
+        email.refresh_from_db()
+        assert email.status == 'sent'
+
+    def test_worker_backs_off_and_gives_up(self):
+        email = OutboxEmail.enqueue('Subject', 'Body', 'office@example.com', ['to@example.com'])[0]
+        with mock.patch('django.core.mail.EmailMessage.send', side_effect=OSError('SMTP down')):
+            call_command('send_outbox_emails', stdout=StringIO())
+            email.refresh_from_db()
+            assert email.status == 'pending'
+            assert email.attempts == 1
+            assert email.next_attempt_at > timezone.now()
+            assert email.last_error == 'SMTP down'
+
+            OutboxEmail.objects.update(next_attempt_at=timezone.now())
+            call_command('send_outbox_emails', max_attempts=2, stdout=StringIO())
+            email.refresh_from_db()
+            assert email.status == 'failed'
+
+
+class BulkReviewTestCase(TestCase):
+    def setUp(self):
+        self.small = Course.objects.create(name='Compilers', code='CS470', credits=3, openings=1)
+        self.large = Course.objects.create(name='Databases', code='CS480', credits=3, openings=2)
+        self.count = 0
+
+    def _requests(self, course, count):
+        requests = []
+        for _ in range(count):
+            self.count += 1
+            student = Student.objects.create(
+                user=User.objects.create(username=f'bulk{self.count}', email=f'bulk{self.count}@example.com'),
+                first_name='Bo', last_name=str(self.count), age=20
+            )
+            requests.append(EnrollmentRequest.objects.create(student=student, course=course, priority=self.count))
+        return requests
+
+    def test_approve_fills_free_seats_by_priority_and_waitlists_the_rest(self):
+        small = self._requests(self.small, 3)
+        large = self._requests(self.large, 3)
+        Enrollment.objects.create(student=large[0].student, course=self.large)
+
+        review = bulk_approve_requests([r.pk for r in small + large])
+
+        assert review.by_course == {
+            'CS470': {'approved': 1, 'waitlisted': 2},
+            'CS480': {'approved': 1, 'already_enrolled': 1, 'waitlisted': 1},
+        }
+        # Highest priority first
+        assert review.outcomes[small[2].pk] == 'approved'
+        assert review.outcomes[large[2].pk] == 'approved'
+        assert review.outcomes[large[0].pk] == 'already_enrolled'
+        assert EnrollmentRequest.objects.get(pk=small[0].pk).status == 'waitlisted'
+        self.small.refresh_from_db()
+        self.large.refresh_from_db()
+        assert (self.small.enrolled_count, self.large.enrolled_count) == (1, 2)
+        assert Enrollment.objects.filter(course=self.large, student=large[2].student).exists()
+        assert OutboxEmail.objects.filter(subject__startswith='Enrollment Approved').count() == 2
+
+    def test_drifted_counter_rolls_back_instead_of_over_enrolling(self):
+        requests = self._requests(self.large, 2)
+        with mock.patch('courses.models.CourseQuerySet.reserve_seats', return_value=0):
+            with self.assertRaises(CourseFullError):
+                bulk_approve_requests([r.pk for r in requests])
+
+        assert not Enrollment.objects.exists()
+        assert set(EnrollmentRequest.objects.values_list('status', flat=True)) == {'pending'}
+        assert not OutboxEmail.objects.exists()
+
+    def test_requests_reviewed_concurrently_are_read_after_the_lock(self):
+        requests = self._requests(self.large, 3)
+        Course.objects.filter(pk=self.large.pk).update(openings=5)
+        teacher = Teacher.objects.create(
+            user=User.objects.create(username='bulkteacher', email='bulkteacher@example.com'),
+            first_name='Te', last_name='Acher', subject='CS'
+        )
+        teacher.courses.add(self.large)
+
+        select_for_update = Course.objects.select_for_update
+        raced = []
+
+        def approve_elsewhere_first(*args, **kwargs):
+            if not raced:
+                raced.append(True)
+                resp = self.client.post(f'/api/teachers/request/{requests[0].pk}/approve/',
+                                        {'teacher_id': teacher.pk}, content_type='application/json')
+                assert resp.status_code == 200, resp.content
+                enroll_student(requests[1].student, self.large)
+            return select_for_update(*args, **kwargs)
+
+        with mock.patch.object(Course.objects, 'select_for_update', side_effect=approve_elsewhere_first):
+            review = bulk_approve_requests([r.pk for r in requests])
+
+        assert raced
+        assert requests[0].pk not in review.outcomes
+        assert review.outcomes[requests[1].pk] == 'already_enrolled'
+        assert review.outcomes[requests[2].pk] == 'approved'
+        assert Enrollment.objects.filter(course=self.large).count() == 3
+
+    def test_query_count_does_not_grow_with_the_batch(self):
+        def approve_queries(requests):
+            with CaptureQueriesContext(connection) as queries:
+                bulk_approve_requests([r.pk for r in requests])
+            return len(queries)
+
+        few = approve_queries(self._requests(self.large, 2))
+        Course.objects.filter(pk=self.large.pk).update(openings=50)
+        assert approve_queries(self._requests(self.large, 12)) == few
+
+    def test_reject_queues_one_email_per_request(self):
+        requests = self._requests(self.small, 2) + self._requests(self.large, 1)
+        review = bulk_reject_requests([r.pk for r in requests], reason='Closed')
+
+        assert review.by_course == {'CS470': {'rejected': 2}, 'CS480': {'rejected': 1}}
+        assert set(EnrollmentRequest.objects.values_list('status', 'notes')) == {('rejected', 'Closed')}
+        assert OutboxEmail.objects.filter(subject__startswith='Enrollment Request rejected').count() == 3
+
+    def test_reject_leaves_approved_requests_enrolled(self):
+        approved, pending = self._requests(self.large, 2)
+        bulk_approve_requests([approved.pk])
+        OutboxEmail.objects.all().delete()
+
+        review = bulk_reject_requests([approved.pk, pending.pk], reason='Closed')
+
+        assert review.outcomes == {approved.pk: 'already_approved', pending.pk: 'rejected'}
+        assert EnrollmentRequest.objects.get(pk=approved.pk).status == 'approved'
+        assert Enrollment.objects.filter(student=approved.student, course=self.large).exists()
+        self.large.refresh_from_db()
+        assert self.large.enrolled_count == 1
+        assert OutboxEmail.objects.count() == 1
+
+
+class IndexUsageTestCase(TestCase):
+    """EXPLAIN the hot queries on a seeded dataset and check they are served by their index"""
+
+    @classmethod
+    def setUpTestData(cls):
+        courses = Course.objects.bulk_create([
+            Course(name=f'Indexed {i}', code=f'IDX{i}', openings=100) for i in range(40)
+        ])
+        users = User.objects.bulk_create([User(username=f'idx{i}') for i in range(1000)])
+        students = Student.objects.bulk_create([
+            Student(user=user, first_name='In', last_name=f'Dex{i}', age=20) for i, user in enumerate(users)
+        ])
+        Enrollment.objects.bulk_create([
+            Enrollment(student=student, course=courses[(i + offset) % 40])
+            for i, student in enumerate(students) for offset in range(4)
+        ])
+        # Mostly closed requests, as after a few terms; a handful per course are still open
+        statuses = ['approved'] * 5 + ['rejected'] * 2 + ['pending', 'waitlisted', 'waitlisted']
+        EnrollmentRequest.objects.bulk_create([
+            EnrollmentRequest(student=student, course=courses[(i + offset) % 40],
+                              status=statuses[(i // 40 + offset) % 10], priority=i % 7)
+            for i, student in enumerate(students) for offset in range(4, 8)
+        ])
+        cls.course = courses[1]
+        cls.courses = courses[:3]
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def assert_uses_index(self, queryset, index_name):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                # The seeded tables are tiny - make the planner show which index it would use
+                cursor.execute('SET LOCAL enable_seqscan = off')
+            plan = queryset.explain()
+            if connection.vendor == 'postgresql':
+                cursor.execute('SET LOCAL enable_seqscan = on')
+        assert index_name in plan, plan
+
+    def test_waitlist_promotion_order(self):
+        self.assert_uses_index(
+            EnrollmentRequest.objects.filter(course=self.course, status='waitlisted')
+            .order_by('-priority', 'requested_at')[:10],
+            'students_er_waitlist_idx',
+        )
+
+    @skipUnless(connection.vendor == 'postgresql', 'SQLite only matches partial indexes to literal IN lists')
+    def test_open_requests_for_dashboard(self):
+        self.assert_uses_index(
+            EnrollmentRequest.objects.filter(course__in=self.courses, status__in=['pending', 'waitlisted']),
+            'students_er_open_idx',
+        )
+
+    def test_course_roster_newest_first(self):
+        self.assert_uses_index(
+            Enrollment.objects.filter(course=self.course).order_by('-enrollment_date'),
+            'students_enr_course_date_idx',
+        )
+
+
+class SeedDataTestCase(TestCase):
+    def test_seeded_counters_match_the_rows(self):
+        call_command('seed_data', students=60, teachers=3, courses=8, requests_per_student=1,
+                     batch_size=25, stdout=StringIO())
+
+        assert Student.objects.count() == 60
+        assert Teacher.objects.count() == 3
+        assert Enrollment.objects.exists()
+        assert EnrollmentRequest.objects.filter(status__in=['pending', 'waitlisted']).exists()
+        for course in Course.objects.annotate(actual=Count('enrollments')):
+            assert course.enrolled_count == course.actual <= course.openings
+        for student in Student.objects.with_gpa():
+            assert student.gpa == round(student.computed_gpa or 0.0, 2)
+        # One hash for every generated user
+        assert User.objects.values('password').distinct().count() == 1
+
+    def test_same_seed_generates_the_same_data(self):
+        def snapshot():
+            return list(Enrollment.objects.order_by('student__user__username', 'course__code').values_list(
+                'student__user__username', 'course__code', 'grade'))
+
+        call_command('seed_data', students=20, teachers=2, courses=5, stdout=StringIO())
+        first = snapshot()
+        User.objects.all().delete()
+        Course.objects.all().delete()
+        call_command('seed_data', students=20, teachers=2, courses=5, stdout=StringIO())
+        assert snapshot() == first
+
+
+class BenchmarkCommandTestCase(TestCase):
+    def setUp(self):
+        call_command('seed_data', students=40, teachers=2, courses=4, enrollments_per_student=1,
+                     requests_per_student=1, stdout=StringIO())
+        self.report_path = os.path.join(tempfile.mkdtemp(), 'report.json')
+
+    def benchmark(self, **options):
+        call_command('benchmark', iterations=3, warmup=1, output=self.report_path,
+                     only=['course_list', 'approve_request', 'teacher_dashboard_view'], stderr=StringIO(), **options)
+        with open(self.report_path) as report_file:
+            return json.load(report_file)
+
+    def test_report_and_rolled_back_mutations(self):
+        pending = EnrollmentRequest.objects.filter(status='pending').count()
+        enrollments = Enrollment.objects.count()
+
+        report = self.benchmark()
+
+        assert set(report['endpoints']) == {'course_list', 'approve_request', 'teacher_dashboard_view'}
+        for result in report['endpoints'].values():
+            assert result['status_codes'] == [200]
+            assert result['latency_ms']['p50'] <= result['latency_ms']['p99']
+            assert result['queries']['max'] >= 1
+        assert report['meta']['dataset']['students'] == 40
+        # Approving ran three times and was rolled back each time
+        assert EnrollmentRequest.objects.filter(status='pending').count() == pending
+        assert Enrollment.objects.count() == enrollments
+
+    def test_approve_request_benchmarked_when_every_course_is_full(self):
+        Course.objects.update(openings=F('enrolled_count'))
+        EnrollmentRequest.objects.filter(status='pending').update(status='waitlisted')
+        openings = dict(Course.objects.values_list('pk', 'openings'))
+
+        report = self.benchmark()
+
+        assert report['endpoints']['approve_request']['status_codes'] == [200]
+        assert report['skipped'] == []
+        assert dict(Course.objects.values_list('pk', 'openings')) == openings
+        assert not EnrollmentRequest.objects.filter(status='approved').exists()
+
+    def test_endpoint_missing_from_the_report_is_a_regression(self):
+        baseline = self.benchmark()
+        report = copy.deepcopy(baseline)
+        del report['endpoints']['approve_request']
+        report['skipped'] = ['approve_request']
+
+        comparison = compare(report, baseline)
+        assert comparison['approve_request'] == {'missing': True, 'regressed': True}
+        assert not comparison['course_list']['regressed']
+        # Endpoints left out with --only are not missing
+        report['meta']['selected'] = ['course_list', 'teacher_dashboard_view']
+        assert 'approve_request' not in compare(report, baseline)
+
+    def test_baseline_with_fewer_queries_is_a_regression(self):
+        report = self.benchmark()
+        report['endpoints']['course_list']['queries']['max'] -= 1
+        baseline_path = self.report_path + '.baseline'
+        with open(baseline_path, 'w') as baseline_file:
+            json.dump(report, baseline_file)
+
+        with self.assertRaisesMessage(CommandError, 'course_list'):
+            self.benchmark(baseline=baseline_path, tolerance=1000)
+        with open(self.report_path) as report_file:
+            assert json.load(report_file)['comparison']['course_list']['queries_change'] == 1
+
+
+class RequestMetricsMiddlewareTestCase(TestCase):
+    def setUp(self):
+        Course.objects.create(name='Metrics', code='MET1', credits=3, openings=5)
+
+    def test_server_timing_counts_every_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/courses/')
+
+        timing = response['Server-Timing']
+        assert f'desc="{len(queries)} queries"' in timing
+        for metric in ('db;dur=', 'mongo;dur=', 'view;dur=', 'total;dur='):
+            assert metric in timing
+
+    @override_settings(REQUEST_METRICS={})
+    def test_approve_request_stays_under_the_default_query_threshold(self):
+        course = Course.objects.get(code='MET1')
+        teacher = Teacher.objects.create(user=User.objects.create(username='met_t'),
+                                         first_name='Me', last_name='T', subject='CS')
+        teacher.courses.add(course)
+        student = Student.objects.create(user=User.objects.create(username='met_s', email='met_s@example.com'),
+                                         first_name='Me', last_name='S', age=20)
+        request = EnrollmentRequest.objects.create(student=student, course=course)
+
+        with self.assertNoLogs('request_metrics', 'WARNING'):
+            response = self.client.post(f'/api/teachers/request/{request.pk}/approve/',
+                                        {'teacher_id': teacher.pk}, content_type='application/json')
+        assert response.status_code == 200
+
+    @override_settings(REQUEST_METRICS={'QUERY_COUNT_THRESHOLD': 0})
+    def test_requests_over_the_threshold_are_logged_with_their_view(self):
+        with self.assertLogs('request_metrics', 'WARNING') as logs:
+            self.client.get('/api/courses/')
+
+        record = json.loads(logs.records[0].getMessage())
+        assert record['view'] == 'courses.views.course_list'
+        assert record['flags'] == ['too_many_queries']
+        assert record['sql_count'] >= 1
+
+    def test_repeated_statements_and_mongo_calls_are_attributed(self):
+        def view(request):
+            for course in Course.objects.all():
+                for _ in range(6):
+                    Course.objects.filter(pk=course.pk).exists()
+            MongoCommandTimer().succeeded(mock.Mock(duration_micros=1500))
+            return HttpResponse()
+
+        with self.assertLogs('request_metrics', 'WARNING') as logs:
+            response = RequestMetricsMiddleware(view)(RequestFactory().get('/'))
+
+        assert 'mongo;dur=1.5;desc="1 calls"' in response['Server-Timing']
+        record = json.loads(logs.records[0].getMessage())
+        assert record['flags'] == ['repeated_query']
+        assert record['repeated_query']['count'] == 6
+
+
+@skipUnless(connection.features.has_select_for_update, 'Needs row-level locking (e.g. PostgreSQL)')
+class ConcurrentEnrollmentTestCase(TransactionTestCase):
+    THREADS = 200
+    OPENINGS = 25
+    MAX_CONNECTIONS = 40
+
+    def test_seat_limit_never_exceeded(self):
+        course = Course.objects.create(name='Registration Day', code='REG100', credits=3, openings=self.OPENINGS)
+        users = User.objects.bulk_create([
+            User(username=f'stress{i}', email=f'stress{i}@example.com', password='!')
+            for i in range(self.THREADS)
+        ])
+        students = Student.objects.bulk_create([
+            Student(user=user, first_name='Stress', last_name=str(i), age=20)
+            for i, user in enumerate(users)
+        ])
+
+        start = threading.Barrier(self.THREADS)
+        db_slots = threading.BoundedSemaphore(self.MAX_CONNECTIONS)
+        outcomes = []
+
+        def worker(student):
+            start.wait()
+            with db_slots:
+                try:
+                    enroll_student(student, copy.copy(course))
+                    outcomes.append('enrolled')
+                except CourseFullError:
+                    outcomes.append('full')
+                except Exception as e:
+                    outcomes.append(repr(e))
+                finally:
+                    connection.close()
+
+        threads = [threading.Thread(target=worker, args=(student,)) for student in students]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        course.refresh_from_db()
+        assert outcomes.count('enrolled') == self.OPENINGS, outcomes
+        assert outcomes.count('full') == self.THREADS - self.OPENINGS
+        assert Enrollment.objects.filter(course=course).count() == self.OPENINGS
+        assert course.enrolled_count == self.OPENINGS
+
+
+class BufferedActivityWriterTestCase(TestCase):
+    class FakeCollection:
+        def __init__(self):
+            self.batches = []
+
+        def insert_many(self, documents, ordered=True):
+            self.batches.append(list(documents))
+
+    def test_writes_in_batches_off_the_request_path(self):
+        collection = self.FakeCollection()
+        writer = BufferedActivityWriter('activity_logs', batch_size=10, flush_interval_ms=50,
+                                        get_collection=lambda: collection)
+        for i in range(25):
+            assert writer.write({'n': i})
+        writer.close()
+
+        assert [doc['n'] for batch in collection.batches for doc in batch] == list(range(25))
+        assert all(len(batch) <= 10 for batch in collection.batches)
+        assert writer.stats['flushed'] == 25
+
+    def test_overflow_drops_or_spills(self):
+        collection = self.FakeCollection()
+        writer = BufferedActivityWriter('activity_logs', max_queue_size=2, get_collection=lambda: collection)
+        writer._ensure_started = lambda: None  # keep the queue full
+        results = [writer.write({'n': i}) for i in range(3)]
+        assert results == [True, True, False]
+        assert writer.stats['dropped'] == 1
+
+        with tempfile.TemporaryDirectory() as spool_dir:
+            spool = ActivitySpool(spool_dir)
+            writer = BufferedActivityWriter('activity_logs', max_queue_size=1, overflow_policy='spill',
+                                            spool=spool, get_collection=lambda: collection)
+            writer._ensure_started = lambda: None
+            assert writer.write({'n': 1}) and writer.write({'n': 2})
+            assert writer.stats['spilled'] == 1
+            assert spool.stats['spooled'] == 1
+
+    def test_spools_while_mongo_is_down_and_replays_later(self):
+        collection = self.FakeCollection()
+        with tempfile.TemporaryDirectory() as spool_dir:
+            spool = ActivitySpool(spool_dir, max_file_bytes=200, max_files=100)
+            writer = BufferedActivityWriter('activity_logs', batch_size=5, spool=spool, get_collection=lambda: None)
+            for i in range(12):
+                writer.write({'n': i, 'at': timezone.now()})
+            writer.close()
+            assert writer.stats['spilled'] == 12
+            assert len(os.listdir(spool_dir)) > 1  # rotated by size
+
+            db = {'activity_logs': collection}
+            assert spool.replay(db) == 12
+            assert spool.replay(db) == 0
+            assert not spool.has_backlog()
+
+        replayed = [doc for batch in collection.batches for doc in batch]
+        assert sorted(doc['n'] for doc in replayed) == list(range(12))
+        assert all(isinstance(doc['at'], datetime) for doc in replayed)
+
+
+class LazyMongoConnectionTestCase(TestCase):
+    def test_connects_on_first_use_and_backs_off_after_failure(self):
+        conn = object.__new__(MongoDBConnection)  # fresh instance, not the shared singleton
+        with mock.patch('mongo_config.MongoClient') as client:
+            client.return_value.admin.command.side_effect = ConnectionFailure('down')
+            assert client.call_count == 0
+
+            assert not conn.is_connected
+            assert not conn.is_connected  # within the retry interval - no second attempt
+            assert client.call_count == 1
+
+            client.return_value.admin.command.side_effect = None
+            assert conn.reconnect()
+            assert client.call_count == 2
+
+    def test_first_read_in_a_process_sees_a_live_server(self):
+        conn = object.__new__(MongoDBConnection)
+        with mock.patch('mongo_config.MongoClient') as client:
+            assert conn.is_connected
+            assert conn.db is not None
+            assert client.call_count == 1
+            assert client.call_args.kwargs['serverSelectionTimeoutMS'] == MongoDBConnection.SERVER_SELECTION_TIMEOUT_MS
+
+    def test_nowait_access_connects_in_the_background(self):
+        conn = object.__new__(MongoDBConnection)
+        released = threading.Event()
+        with mock.patch('mongo_config.MongoClient') as client:
+            client.return_value.admin.command.side_effect = lambda *args: released.wait(5)
+
+            started = time.monotonic()
+            assert conn.get_db(wait=False) is None
+            assert time.monotonic() - started < 1
+
+            released.set()
+            conn._connect_thread.join()
+            assert conn.get_db(wait=False) is not None
+            assert client.call_count == 1
+
+
+# Role claims are only trusted with a cache every worker shares - a file cache stands in for Redis
+SHARED_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                            'LOCATION': tempfile.mkdtemp()}}
+
+
+@override_settings(CACHES=SHARED_CACHE)
+class UserRoleTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='role1', email='role1@example.com', password='pass')
+        self.student = Student.objects.create(user=self.user, first_name='Ro', last_name='Le', age=20)
+
+    def test_role_resolved_once_per_user(self):
+        request = RequestFactory().get('/')
+        request.user = User.objects.get(pk=self.user.pk)
+
+        with self.assertNumQueries(1):
+            assert get_user_type(request.user) == 'student'
+            context = user_type_processor(request)
+            assert get_user_role(request.user).profile_id == self.student.id
+            assert request.user.student_profile.last_name == 'Le'
+            assert not hasattr(request.user, 'teacher_profile')
+        assert context['is_student'] and not context['is_teacher']
+
+    def test_role_from_jwt_claims_until_profile_changes(self):
+        token = CustomTokenObtainPairSerializer.get_token(self.user).access_token
+        request = RequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {token}')
+
+        user, _ = RoleClaimsJWTAuthentication().authenticate(request)
+        with self.assertNumQueries(0):
+            assert get_user_role(user) == ('student', self.student.id, False, True)
+
+        Teacher.objects.create(user=self.user, first_name='Ro', last_name='Le', subject='Math')
+        user, _ = RoleClaimsJWTAuthentication().authenticate(request)
+        with self.assertNumQueries(1):
+            assert get_user_type(user) == 'teacher'
+
+    def test_admin_claim_dropped_when_superuser_revoked(self):
+        self.user.is_superuser = True
+        self.user.save()
+        token = CustomTokenObtainPairSerializer.get_token(self.user).access_token
+        request = RequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        user, _ = RoleClaimsJWTAuthentication().authenticate(request)
+        assert get_user_type(user) == 'admin'
+
+        self.user.is_superuser = False
+        self.user.save()
+        user, _ = RoleClaimsJWTAuthentication().authenticate(request)
+        assert get_user_type(user) == 'student'
+        user, _ = ClaimsJWTAuthentication().authenticate(request)
+        assert get_user_type(user) == 'student'
+
+    def test_admin_claim_not_trusted_without_superuser_flag(self):
+        self.user.is_superuser = True
+        token = CustomTokenObtainPairSerializer.get_token(self.user).access_token  # never saved
+        request = RequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        user, _ = RoleClaimsJWTAuthentication().authenticate(request)
+        assert get_user_type(user) == 'student'
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_claims_not_trusted_with_a_per_process_cache(self):
+        token = CustomTokenObtainPairSerializer.get_token(self.user).access_token
+        request = RequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        user, _ = RoleClaimsJWTAuthentication().authenticate(request)
+        with self.assertNumQueries(1):
+            assert get_user_type(user) == 'student'
+
+    def test_role_recorded_in_session_at_login(self):
+        self.client.login(username='role1', password='pass')
+        request = RequestFactory().get('/')
+        request.session = self.client.session
+        assert '_user_role' in request.session  # reading the session row is SessionMiddleware's query
+        request.user = User.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(0):
+            assert get_request_role(request).profile_id == self.student.id
+
+
+@override_settings(CACHES=SHARED_CACHE)
+class ClaimsAuthenticationTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='claims1', email='claims1@example.com', password='pass')
+        self.student = Student.objects.create(user=self.user, first_name='Cl', last_name='Aims', age=20)
+        self.course = Course.objects.create(name='Compilers', code='CS440', credits=3, openings=5)
+        token = CustomTokenObtainPairSerializer.get_token(self.user).access_token
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {token}'}
+
+    def test_request_enrollment_never_loads_the_user(self):
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.post('/api/students/enrollment/request/', {
+                'student_id': self.student.id, 'course_id': self.course.id
+            }, content_type='application/json', **self.auth)
+        assert resp.status_code == 201, resp.content
+        assert not any('auth_user' in q['sql'] for q in queries.captured_queries)
+
+    def test_claims_user_loads_full_user_on_demand(self):
+        request = RequestFactory().get('/', **self.auth)
+        user, _ = ClaimsJWTAuthentication().authenticate(request)
+        with self.assertNumQueries(0):
+            assert user.id == self.user.id and user == self.user
+            assert user.email == 'claims1@example.com'
+            assert get_user_type(user) == 'student'
+        with self.assertNumQueries(1):
+            assert user.date_joined == self.user.date_joined
+            assert full_user(user).pk == self.user.pk
+
+
+class StreamingExportTestCase(TestCase):
+    def setUp(self):
+        course = Course.objects.create(name='Databases', code='CS301', credits=3, openings=10)
+        for i, grade in enumerate([91, None]):
+            student = Student.objects.create(
+                user=User.objects.create_user(username=f'export{i}', email=f'export{i}@example.com', password='pass'),
+                first_name='Ex', last_name=f'Port{i}', age=20
+            )
+            Enrollment.objects.create(student=student, course=course, grade=grade)
+
+    def test_enrollment_export_streams_json_and_csv(self):
+        resp = self.client.get('/api/students/enrollments/export/')
+        assert resp.streaming
+        rows = json.loads(b''.join(resp.streaming_content))
+        assert [(row['student__last_name'], row['letter_grade']) for row in rows] == [('Port0', 'A'), ('Port1', None)]
+
+        resp = self.client.get('/api/students/students/export/', {'format': 'csv'})
+        assert resp['Content-Disposition'] == 'attachment; filename="students.csv"'
+        lines = b''.join(resp.streaming_content).decode().splitlines()
+        assert lines[0].startswith('id,first_name,last_name,age,gpa')
+        assert len(lines) == 3
+
+        resp = self.client.get('/api/courses/export/')
+        course = json.loads(b''.join(resp.streaming_content))[0]
+        assert (course['enrolled_count'], course['available_spots']) == (2, 8)
+
+
+@override_settings(STORAGES={
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+})
+class AdminChangelistTestCase(TestCase):
+    def setUp(self):
+        User.objects.create_superuser(username='admin', email='admin@example.com', password='pass')
+        self.client.login(username='admin', password='pass')
+        self.count = 0
+
+    def _add_rows(self, count):
+        for _ in range(count):
+            self.count += 1
+            course = Course.objects.create(name=f'Admin {self.count}', code=f'ADM{self.count}', credits=3, openings=5)
+            student = Student.objects.create(
+                user=User.objects.create_user(username=f'adm{self.count}', email=f'adm{self.count}@example.com', password='!'),
+                first_name='Ad', last_name=str(self.count), age=20
+            )
+            Enrollment.objects.create(student=student, course=course)
+            other = Course.objects.create(name=f'Other {self.count}', code=f'OTH{self.count}', credits=3, openings=5)
+            EnrollmentRequest.objects.create(student=student, course=other, status='waitlisted')
+
+    def test_changelists_run_a_fixed_number_of_queries(self):
+        urls = ('/admin/students/enrollment/', '/admin/students/enrollmentrequest/', '/admin/courses/course/')
+
+        def changelist_queries():
+            counts = []
+            for url in urls:
+                with CaptureQueriesContext(connection) as queries:
+                    assert self.client.get(url).status_code == 200
+                counts.append(len(queries))
+            return counts
+
+        self._add_rows(2)
+        before = changelist_queries()
+        self._add_rows(6)
+        assert changelist_queries() == before
+
+    def test_approve_action_reports_per_course(self):
+        self._add_rows(2)
+        ids = list(EnrollmentRequest.objects.values_list('pk', flat=True))
+        response = self.client.post('/admin/students/enrollmentrequest/', {
+            'action': 'approve_requests', '_selected_action': ids,
+        }, follow=True)
+
+        messages = [str(message) for message in response.context['messages']]
+        assert messages == ['Successfully approved 2 request(s). OTH1: 1 approved; OTH2: 1 approved']
+        assert EnrollmentRequest.objects.filter(status='approved').count() == 2
@@ -17,10 +17,12 @@ urlpatterns = [
     path('students/add/', views.add_student, name='add_student'),
     path('students/<int:student_id>/update/', views.update_student, name='update_student'),
     path('students/<int:student_id>/delete/', views.delete_student, name='delete_student'),
+    path('students/export/', views.export_students, name='export_students'),
 
     # Enrollment endpoints (student perspective)
     path('enrollment/request/', views.request_enrollment, name='request_enrollment'),
     path('students/<int:student_id>/enrollments/', views.my_enrollments, name='my_enrollments'),
     path('students/<int:student_id>/requests/', views.my_enrollment_requests, name='my_requests'),
+    path('enrollments/export/', views.export_enrollments, name='export_enrollments'),
 ]
 
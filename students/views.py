@@ -4,22 +4,58 @@ from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, authentication_classes
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
 from rest_framework import status
-from .models import Student, Enrollment, EnrollmentRequest
+from .jwt_authentication import CLAIMS_AUTHENTICATION_CLASSES
+from .models import Student, Enrollment, EnrollmentRequest, letter_grade_for
 from courses.models import Course
+from pagination import paginate, paginated_list_response, handle_page_errors
+from streaming import export_response
 import json
 
 
 @require_http_methods(["GET"])
+@handle_page_errors
 def student_list(request):
-    students = Student.objects.all().values(
-        'id', 'first_name', 'last_name', 'age', 'gpa',
+    students = Student.objects.with_gpa().values(
+        'id', 'first_name', 'last_name', 'age', 'computed_gpa',
         'user__username', 'user__email', 'created_at'
     )
-    return JsonResponse(list(students), safe=False)
+    students, next_cursor = paginate(request, students, ('id',))
+
+    students_list = []
+    for student in students:
+        student['gpa'] = student.pop('computed_gpa')
+        students_list.append(student)
+
+    return paginated_list_response(request, students_list, next_cursor)
+
+
+@require_http_methods(["GET"])
+def export_students(request):
+    """Stream every student as JSON (default) or CSV (?format=csv)"""
+    fields = (
+        'id', 'first_name', 'last_name', 'age', 'gpa', 'total_credits',
+        'user__username', 'user__email', 'created_at'
+    )
+    students = Student.objects.values_list(*fields).order_by('id')
+    return export_response(request, 'students', fields, students)
+
+
+@require_http_methods(["GET"])
+def export_enrollments(request):
+    """Stream every enrollment with its grade as JSON (default) or CSV (?format=csv)"""
+    fields = (
+        'id', 'student__id', 'student__first_name', 'student__last_name',
+        'course__id', 'course__code', 'course__credits', 'enrollment_date', 'grade'
+    )
+    enrollments = Enrollment.objects.values_list(*fields).order_by('id')
+    return export_response(
+        request, 'enrollments', fields + ('letter_grade',), enrollments,
+        transform=lambda row: row + (letter_grade_for(row[-1]),)
+    )
 
 
 @require_http_methods(["GET"])
@@ -53,8 +89,7 @@ def add_student(request):
             user_id=data.get('user_id'),
             first_name=data.get('first_name'),
             last_name=data.get('last_name'),
-            age=data.get('age'),
-            gpa=data.get('gpa', 0.0)
+            age=data.get('age')
         )
 
         return JsonResponse({
@@ -76,7 +111,6 @@ def update_student(request, student_id):
         student.first_name = data.get('first_name', student.first_name)
         student.last_name = data.get('last_name', student.last_name)
         student.age = data.get('age', student.age)
-        student.gpa = data.get('gpa', student.gpa)
         student.save()
 
         return JsonResponse({
@@ -111,6 +145,7 @@ def delete_student(request, student_id):
 
 
 @api_view(['POST'])
+@authentication_classes(CLAIMS_AUTHENTICATION_CLASSES)
 @permission_classes([IsAuthenticated])
 def request_enrollment(request):
     """
@@ -122,7 +157,7 @@ def request_enrollment(request):
         student = get_object_or_404(Student, id=data.get('student_id'))
 
         # Verify the authenticated user owns this student profile
-        if request.user != student.user:
+        if request.user.id != student.user_id:
             return Response({'error': 'You can only request enrollment for yourself'},
                           status=status.HTTP_403_FORBIDDEN)
 
@@ -167,6 +202,7 @@ def request_enrollment(request):
 
 
 @require_http_methods(["GET"])
+@handle_page_errors
 def my_enrollments(request, student_id):
     student = get_object_or_404(Student, id=student_id)
 
@@ -181,8 +217,9 @@ def my_enrollments(request, student_id):
         'enrolled_by__first_name',
         'enrolled_by__last_name'
     )
+    enrollments, next_cursor = paginate(request, enrollments, ('id',))
 
-    return JsonResponse(list(enrollments), safe=False)
+    return paginated_list_response(request, enrollments, next_cursor)
 
 
 @require_http_methods(["GET"])
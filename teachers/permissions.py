@@ -0,0 +1,54 @@
+# Teacher-course membership checks shared by the REST and template views
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from user_roles import cache_is_shared
+from .models import Teacher
+
+TEACHER_COURSES_CACHE_KEY = 'teacher_courses:{}'
+
+
+def teacher_course_ids(teacher):
+    """
+    Ids of the courses a teacher teaches, as a frozenset
+
+    Read from the course/teacher link table's teacher_id index only - no course rows
+    are loaded. The set is memoized on the teacher (request.user.teacher_profile lives
+    for one request). With a cache shared by all workers it is also cached for
+    TEACHER_COURSES_CACHE_SECONDS; a per-process cache would miss other workers'
+    invalidations, so then every request reads it again.
+    """
+    course_ids = getattr(teacher, '_course_ids_cache', None)
+    if course_ids is not None:
+        return course_ids
+
+    shared = cache_is_shared()
+    key = TEACHER_COURSES_CACHE_KEY.format(teacher.pk)
+    course_ids = cache.get(key) if shared else None
+    if course_ids is None:
+        course_ids = frozenset(
+            Teacher.courses.through.objects.filter(teacher_id=teacher.pk).values_list('course_id', flat=True)
+        )
+        if shared:
+            cache.set(key, course_ids, timeout=getattr(settings, 'TEACHER_COURSES_CACHE_SECONDS', 60))
+
+    teacher._course_ids_cache = course_ids
+    return course_ids
+
+
+def teaches_course(teacher, course):
+    """Does the teacher teach this course? course may be a Course or a course id"""
+    if teacher is None:
+        return False
+    return getattr(course, 'pk', course) in teacher_course_ids(teacher)
+
+
+def invalidate_teacher_courses(*teacher_ids):
+    """
+    Forget cached course-id sets once the assignment change commits
+
+    Deleting earlier would let a concurrent request cache the pre-commit set again,
+    and a rolled-back change needs no invalidation at all.
+    """
+    keys = [TEACHER_COURSES_CACHE_KEY.format(teacher_id) for teacher_id in teacher_ids]
+    transaction.on_commit(lambda: cache.delete_many(keys))
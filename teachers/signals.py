@@ -0,0 +1,37 @@
+# Signal handlers for teacher profiles and course assignments
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from user_roles import invalidate_user_role
+from .models import Teacher
+from .permissions import invalidate_teacher_courses
+
+
+@receiver(post_save, sender=Teacher)
+@receiver(post_delete, sender=Teacher)
+def invalidate_teacher_role(sender, instance, created=True, **kwargs):
+    """A new or deleted teacher profile changes the user's role claims"""
+    if created:
+        invalidate_user_role(instance.user_id, instance._state.fields_cache.get('user'))
+
+
+@receiver(post_save, sender=Teacher)
+@receiver(post_delete, sender=Teacher)
+def forget_course_assignments(sender, instance, created=True, **kwargs):
+    """A new teacher must not inherit a cached set left behind by a deleted one with the same id"""
+    if created:
+        invalidate_teacher_courses(instance.pk)
+
+
+@receiver(m2m_changed, sender=Teacher.courses.through)
+def invalidate_course_assignments(sender, instance, action, reverse, pk_set, **kwargs):
+    """Adding or removing course assignments (from either side) makes cached course-id sets stale"""
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+
+    if not reverse:
+        instance.__dict__.pop('_course_ids_cache', None)
+        invalidate_teacher_courses(instance.pk)
+    elif action == 'pre_clear':
+        invalidate_teacher_courses(*instance.teachers.values_list('pk', flat=True))
+    elif pk_set:
+        invalidate_teacher_courses(*pk_set)
@@ -1,12 +1,18 @@
 # python
-from django.test import TestCase, RequestFactory
+from django.test import TestCase, RequestFactory, override_settings
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import User
 from django.utils import timezone
 from datetime import timedelta
 import json
+import tempfile
+from unittest import mock
 from . import views as teacher_views
 from teachers import views as teacher_views
 from teachers.models import Teacher
+from teachers.permissions import teaches_course
 from courses.models import Course
 from students.models import Student, Enrollment, EnrollmentRequest
 
@@ -74,6 +80,13 @@ class TeacherViewsTestCase(TestCase):
         data = self._json_response(resp)
         assert any(r['student__id'] == self.student.id for r in data)
 
+    def test_pending_requests_read_the_stored_gpa(self):
+        Student.objects.filter(pk=self.student.pk).update(gpa=3.7)
+        with CaptureQueriesContext(connection) as queries:
+            resp = teacher_views.pending_requests(self.factory.get('/teachers/pending/'), self.teacher.id)
+        assert [r['student__gpa'] for r in self._json_response(resp)] == [3.7]
+        assert not any('GROUP BY' in q['sql'] for q in queries.captured_queries)
+
     def test_approve_request_permission_and_full_checks(self):
         # Permission check: teacher2 tries to approve request for course teacher1 teaches -> should be 403
         # create a new student for this test
@@ -140,6 +153,84 @@ class TeacherViewsTestCase(TestCase):
         assert r.status == 'rejected'
         assert r.reviewed_by == self.teacher
 
+    def test_review_requests_batch(self):
+        students = []
+        for i in range(2):
+            user = User.objects.create_user(username=f'batch{i}', email=f'batch{i}@example.com', password='pass')
+            students.append(Student.objects.create(user=user, first_name='Batch', last_name=str(i), age=20))
+        waitlisted = EnrollmentRequest.objects.create(student=students[0], course=self.course_full)
+        to_reject = EnrollmentRequest.objects.create(student=students[1], course=self.course)
+
+        def review(teacher, items):
+            body = json.dumps({'teacher_id': teacher.id, 'items': items})
+            req = self.factory.post('/teachers/requests/review/', data=body, content_type='application/json')
+            resp = teacher_views.review_requests(req)
+            assert resp.status_code == 200
+            return self._json_response(resp)
+
+        data = review(self.teacher2, [{'request_id': waitlisted.id, 'action': 'approve'}])
+        assert data['results'][0]['error'] == 'You do not have permission to review requests for this course'
+
+        data = review(self.teacher, [
+            {'request_id': self.enroll_req.id, 'action': 'approve'},
+            {'request_id': waitlisted.id, 'action': 'approve'},
+            {'request_id': to_reject.id, 'action': 'reject', 'notes': 'not eligible'},
+            {'request_id': 999999, 'action': 'approve'},
+            {'request_id': to_reject.id, 'action': 'enroll'},
+        ])
+        assert [(r['status'], r['error']) for r in data['results']] == [
+            ('approved', None),
+            ('waitlisted', None),
+            ('rejected', None),
+            (None, 'Enrollment request not found'),
+            (None, 'Each item needs an integer request_id and action approve or reject'),
+        ]
+        assert data['summary'] == {'approved': 1, 'waitlisted': 1, 'rejected': 1, 'failed': 2}
+        assert Enrollment.objects.filter(student=self.student, course=self.course, enrolled_by=self.teacher).exists()
+        to_reject.refresh_from_db()
+        assert (to_reject.status, to_reject.notes, to_reject.reviewed_by) == ('rejected', 'not eligible', self.teacher)
+
+    def _review(self, items):
+        body = json.dumps({'teacher_id': self.teacher.id, 'items': items})
+        req = self.factory.post('/teachers/requests/review/', data=body, content_type='application/json')
+        resp = teacher_views.review_requests(req)
+        assert resp.status_code == 200
+        return self._json_response(resp)
+
+    def test_review_requests_reports_concurrent_approval_per_item(self):
+        bulk_approve_requests = teacher_views.bulk_approve_requests
+
+        def approved_elsewhere_first(request_ids, teacher):
+            EnrollmentRequest.objects.get(pk=self.enroll_req.pk).approve(self.teacher)
+            return bulk_approve_requests(request_ids, teacher)
+
+        with mock.patch('teachers.views.bulk_approve_requests', side_effect=approved_elsewhere_first):
+            data = self._review([{'request_id': self.enroll_req.id, 'action': 'approve'}])
+        assert data['results'][0]['error'] == 'Request already approved'
+        assert Enrollment.objects.filter(student=self.student, course=self.course).count() == 1
+
+    def test_review_requests_cannot_reject_an_approved_request(self):
+        self.enroll_req.approve(self.teacher)
+        data = self._review([{'request_id': self.enroll_req.id, 'action': 'reject'}])
+        assert data['results'][0]['error'] == 'Request already approved'
+        self.enroll_req.refresh_from_db()
+        assert self.enroll_req.status == 'approved'
+
+    def test_review_requests_integrity_error_fails_only_its_items(self):
+        user = User.objects.create_user(username='batch9', email='batch9@example.com', password='pass')
+        other = Student.objects.create(user=user, first_name='Batch', last_name='9', age=20)
+        to_reject = EnrollmentRequest.objects.create(student=other, course=self.course)
+
+        with mock.patch('teachers.views.bulk_approve_requests', side_effect=IntegrityError('duplicate key')):
+            data = self._review([
+                {'request_id': self.enroll_req.id, 'action': 'approve'},
+                {'request_id': to_reject.id, 'action': 'reject'},
+            ])
+        assert [(r['status'], r['error']) for r in data['results']] == [
+            (None, 'Request was changed by a concurrent review - try again'),
+            ('rejected', None),
+        ]
+
     def test_direct_enroll(self):
         # permission: teacher2 doesn't teach course_full -> 403 when trying to enroll someone into course_full via teacher2
         body = json.dumps({'teacher_id': self.teacher2.id, 'student_id': self.student.id, 'course_id': self.course_full.id})
@@ -236,3 +327,57 @@ class TeacherViewsTestCase(TestCase):
         assert data['new_grade'] == 'A'
         enrollment.refresh_from_db()
         assert enrollment.grade == 'A'
+
+
+# Course-id sets are only cached across requests with a shared cache - a file cache stands in for Redis
+SHARED_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                            'LOCATION': tempfile.mkdtemp()}}
+
+
+@override_settings(CACHES=SHARED_CACHE)
+class TeacherPermissionTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create(username='perm_t', email='perm_t@example.com')
+        self.teacher = Teacher.objects.create(user=user, first_name='Pat', last_name='T', subject='CS')
+        self.course = Course.objects.create(name='Networks', code='CS430', credits=3, openings=5)
+        self.other = Course.objects.create(name='Graphics', code='CS440', credits=3, openings=5)
+        self.teacher.courses.add(self.course)
+
+    def test_membership_is_cached_per_request_and_across_requests(self):
+        with self.assertNumQueries(1):
+            assert teaches_course(self.teacher, self.course)
+            assert not teaches_course(self.teacher, self.other.id)
+        # Another request gets a fresh Teacher object but the cached set
+        with self.assertNumQueries(0):
+            assert teaches_course(Teacher(pk=self.teacher.pk), self.course)
+
+    def test_assignment_changes_invalidate_the_cache(self):
+        assert not teaches_course(self.teacher, self.other)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.other.teachers.add(self.teacher)
+        assert teaches_course(Teacher(pk=self.teacher.pk), self.other)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.teacher.courses.remove(self.course)
+        assert not teaches_course(self.teacher, self.course)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.other.teachers.clear()
+        assert not teaches_course(Teacher(pk=self.teacher.pk), self.other)
+
+    def test_rolled_back_assignment_change_leaves_the_cache_alone(self):
+        assert teaches_course(self.teacher, self.course)
+        with self.captureOnCommitCallbacks() as callbacks:
+            with transaction.atomic():
+                self.teacher.courses.remove(self.course)
+                transaction.set_rollback(True)
+        assert callbacks == []
+        with self.assertNumQueries(0):
+            assert teaches_course(Teacher(pk=self.teacher.pk), self.course)
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_per_process_cache_is_not_used_for_permissions(self):
+        assert teaches_course(self.teacher, self.course)
+        with self.assertNumQueries(1):
+            assert teaches_course(Teacher(pk=self.teacher.pk), self.course)
@@ -15,6 +15,7 @@ urlpatterns = [
     path('<int:course_id>/deadline/', views.update_enrollment_deadline, name='update_deadline'),
     path('request/<int:request_id>/approve/', views.approve_request, name='approve_request'),
     path('request/<int:request_id>/reject/', views.reject_request, name='reject_request'),
+    path('requests/review/', views.review_requests, name='review_requests'),
     
     # Direct enrollment
     path('enroll/', views.direct_enroll, name='direct_enroll'),
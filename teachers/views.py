@@ -1,22 +1,34 @@
 from django.http import JsonResponse
+from django.db import IntegrityError, transaction
+from django.db.models import F
 from django.shortcuts import get_object_or_404
 from django.utils.dateparse import parse_datetime
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.utils import timezone
 from .models import Teacher
+from .permissions import teacher_course_ids, teaches_course
 from students.models import Student, Enrollment, EnrollmentRequest
 from courses.models import Course
+from students.services import (
+    enroll_student, run_with_retry, bulk_approve_requests, bulk_reject_requests,
+    CourseFullError, AlreadyEnrolledError,
+)
+from pagination import paginate, paginated_list_response, handle_page_errors
 import json
 
+MAX_REVIEW_ITEMS = 1000
+
 
 @require_http_methods(["GET"])
+@handle_page_errors
 def teacher_list(request):
     teachers = Teacher.objects.all().values(
         'id', 'first_name', 'last_name', 'subject',
         'user__username', 'user__email', 'created_at'
     )
-    return JsonResponse(list(teachers), safe=False)
+    teachers, next_cursor = paginate(request, teachers, ('id',))
+    return paginated_list_response(request, teachers, next_cursor)
 
 
 
@@ -44,26 +56,28 @@ def teacher_detail(request, teacher_id):
 
 
 @require_http_methods(["GET"])
+@handle_page_errors
 def pending_requests(request, teacher_id):
     teacher = get_object_or_404(Teacher, id=teacher_id)
 
     requests = EnrollmentRequest.objects.filter(
         course__in=teacher.courses.all(),
         status='pending'
-    ).select_related('student', 'course').values(
+    ).values(
         'id',
         'student__id',
         'student__first_name',
         'student__last_name',
-        'student__gpa',
         'course__id',
         'course__name',
         'course__code',
+        'student__gpa',
         'requested_at',
         'notes'
-    ).order_by('-requested_at')
+    )
+    requests, next_cursor = paginate(request, requests, ('-requested_at', '-id'))
 
-    return JsonResponse(list(requests), safe=False)
+    return paginated_list_response(request, requests, next_cursor)
 
 
 @csrf_exempt
@@ -72,10 +86,13 @@ def approve_request(request, request_id):
     try:
         data = json.loads(request.body)
         teacher = get_object_or_404(Teacher, id=data.get('teacher_id'))
-        enrollment_request = get_object_or_404(EnrollmentRequest, id=request_id)
+        # Approval, the email and the response all need the student, their user and the course
+        enrollment_request = get_object_or_404(
+            EnrollmentRequest.objects.select_related('student__user', 'course'), id=request_id
+        )
 
         # Permission check
-        if enrollment_request.course not in teacher.courses.all():
+        if not teaches_course(teacher, enrollment_request.course_id):
             return JsonResponse({
                 'error': 'You do not have permission to approve requests for this course'
             }, status=403)
@@ -84,12 +101,10 @@ def approve_request(request, request_id):
         if enrollment_request.status == 'approved':
             return JsonResponse({'error': 'Request already approved'}, status=400)
 
-        # Check if course is full
-        if enrollment_request.course.is_full:
-            return JsonResponse({
-                'error': f'Cannot enroll - course is full ({enrollment_request.course.enrolled_students}/{enrollment_request.course.openings})'
-            }, status=400)
-        enrollment = enrollment_request.approve(teacher)
+        try:
+            enrollment = enrollment_request.approve(teacher)
+        except (CourseFullError, AlreadyEnrolledError) as e:
+            return JsonResponse({'error': f'Cannot enroll - {e.message}'}, status=400)
 
         return JsonResponse({
             'message': 'Enrollment request approved successfully',
@@ -111,7 +126,7 @@ def reject_request(request, request_id):
         enrollment_request = get_object_or_404(EnrollmentRequest, id=request_id)
 
         # Permission check
-        if enrollment_request.course not in teacher.courses.all():
+        if not teaches_course(teacher, enrollment_request.course_id):
             return JsonResponse({
                 'error': 'You do not have permission to reject requests for this course'
             }, status=403)
@@ -134,6 +149,116 @@ def reject_request(request, request_id):
         return JsonResponse({'error': str(e)}, status=400)
 
 
+@csrf_exempt
+@require_http_methods(["POST"])
+def review_requests(request):
+    """
+    Approve or reject many enrollment requests in one call and one transaction
+
+    Body: {"teacher_id": 1, "items": [{"request_id": 5, "action": "approve"},
+                                      {"request_id": 6, "action": "reject", "notes": "..."}]}
+    Each item gets its own entry in "results"; one bad item doesn't fail the others.
+    """
+    try:
+        data = json.loads(request.body)
+        teacher = get_object_or_404(Teacher, id=data.get('teacher_id'))
+        items = data.get('items')
+        if not isinstance(items, list) or not items:
+            return JsonResponse({'error': 'items must be a non-empty list'}, status=400)
+        if len(items) > MAX_REVIEW_ITEMS:
+            return JsonResponse({'error': f'At most {MAX_REVIEW_ITEMS} items per call'}, status=400)
+
+        results = [_review_result(item) for item in items]
+        valid = {}
+        for index, item in enumerate(items):
+            request_id = item.get('request_id') if isinstance(item, dict) else None
+            if not isinstance(request_id, int) or item.get('action') not in ('approve', 'reject'):
+                results[index]['error'] = 'Each item needs an integer request_id and action approve or reject'
+            elif request_id in valid:
+                results[index]['error'] = 'Duplicate request_id'
+            else:
+                valid[request_id] = index
+
+        # One lookup for every request; permissions come from the cached course-id set
+        found = list(EnrollmentRequest.objects.filter(id__in=valid).values_list('id', 'course_id', 'status'))
+        allowed_courses = teacher_course_ids(teacher)
+
+        approve_ids = []
+        reject_ids = {}
+        statuses = {}
+        for request_id, course_id, status in found:
+            item = items[valid[request_id]]
+            statuses[request_id] = status
+            if course_id not in allowed_courses:
+                results[valid[request_id]]['error'] = 'You do not have permission to review requests for this course'
+            elif item['action'] == 'approve':
+                approve_ids.append(request_id)
+            else:
+                reject_ids.setdefault(str(item.get('notes') or ''), []).append(request_id)
+        for request_id, index in valid.items():
+            if request_id not in statuses:
+                results[index]['error'] = 'Enrollment request not found'
+
+        reviewed_ids = approve_ids + [request_id for ids in reject_ids.values() for request_id in ids]
+
+        def review():
+            outcomes = {}
+
+            def attempt(bulk_review, request_ids, *args, **kwargs):
+                try:
+                    with transaction.atomic():
+                        outcomes.update(bulk_review(request_ids, teacher, *args, **kwargs).outcomes)
+                except IntegrityError:
+                    pass  # Lost a race with a concurrent review - those items are reported below
+
+            if approve_ids:
+                attempt(bulk_approve_requests, approve_ids)
+            for notes, request_ids in reject_ids.items():
+                attempt(bulk_reject_requests, request_ids, reason=notes)
+
+            # The statuses read above weren't locked; re-read the ones left unreviewed so a
+            # request reviewed concurrently reports what actually happened to it
+            current = dict(EnrollmentRequest.objects.filter(
+                id__in=[request_id for request_id in reviewed_ids if request_id not in outcomes]
+            ).values_list('id', 'status'))
+            return outcomes, current
+
+        outcomes, current = run_with_retry(review)
+
+        for request_id in reviewed_ids:
+            result = results[valid[request_id]]
+            outcome = outcomes.get(request_id)
+            status = current.get(request_id)
+            if outcome == 'already_enrolled':
+                result['error'] = 'Student is already enrolled in this course'
+            elif outcome == 'already_approved':
+                result['error'] = 'Request already approved'
+            elif outcome is not None:
+                result['status'] = outcome
+            elif status is None:
+                result['error'] = 'Enrollment request not found'
+            elif status in ('pending', 'waitlisted'):
+                result['error'] = 'Request was changed by a concurrent review - try again'
+            else:
+                result['error'] = f'Request already {status}'
+
+        summary = {}
+        for result in results:
+            key = result['status'] or 'failed'
+            summary[key] = summary.get(key, 0) + 1
+
+        return JsonResponse({'results': results, 'summary': summary})
+
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+
+def _review_result(item):
+    """Result entry for one review item; status stays None unless the review went through"""
+    item = item if isinstance(item, dict) else {}
+    return {'request_id': item.get('request_id'), 'action': item.get('action'), 'status': None, 'error': None}
+
+
 @csrf_exempt
 @require_http_methods(["POST"])
 def direct_enroll(request):
@@ -145,28 +270,20 @@ def direct_enroll(request):
         course = get_object_or_404(Course, id=data.get('course_id'))
 
         # Permission check
-        if course not in teacher.courses.all():
+        if not teaches_course(teacher, course):
             return JsonResponse({
                 'error': 'You do not have permission to enroll students in this course'
             }, status=403)
 
-        # if course is full
-        if course.is_full:
-            return JsonResponse({
-                'error': f'Cannot enroll - course is full ({course.enrolled_students}/{course.openings})'
-            }, status=400)
-
-        # Create enrollment
-        enrollment, created = Enrollment.objects.get_or_create(
-            student=student,
-            course=course,
-            defaults={'enrolled_by': teacher}
-        )
-
-        if not created:
+        # Create enrollment (locks the course row for the capacity check)
+        try:
+            enrollment = enroll_student(student, course, enrolled_by=teacher)
+        except AlreadyEnrolledError:
             return JsonResponse({
                 'error': 'Student is already enrolled in this course'
             }, status=400)
+        except CourseFullError as e:
+            return JsonResponse({'error': f'Cannot enroll - {e.message}'}, status=400)
 
         return JsonResponse({
             'message': 'Student enrolled successfully',
@@ -181,12 +298,13 @@ def direct_enroll(request):
 
 
 @require_http_methods(["GET"])
+@handle_page_errors
 def course_students(request, teacher_id, course_id):
     teacher = get_object_or_404(Teacher, id=teacher_id)
     course = get_object_or_404(Course, id=course_id)
 
     # Permission check
-    if course not in teacher.courses.all():
+    if not teaches_course(teacher, course):
         return JsonResponse({
             'error': 'You do not have permission to view students in this course'
         }, status=403)
@@ -202,7 +320,8 @@ def course_students(request, teacher_id, course_id):
         'grade',
         'enrolled_by__first_name',
         'enrolled_by__last_name'
-    ).order_by('student__last_name')
+    )
+    enrollments, next_cursor = paginate(request, enrollments, ('student__last_name', 'id'))
 
     return JsonResponse({
         'course': {
@@ -210,9 +329,10 @@ def course_students(request, teacher_id, course_id):
             'name': course.name,
             'code': course.code
         },
-        'total_students': len(enrollments),
-        'students': list(enrollments)
-    }, safe=False)
+        'total_students': course.enrolled_count,
+        'students': enrollments,
+        'next_cursor': next_cursor
+    })
 
 
 @csrf_exempt
@@ -222,7 +342,7 @@ def update_enrollment_deadline(request, course_id):
         data = json.loads(request.body)
         teacher = get_object_or_404(Teacher, id=data.get('teacher_id'))
         course = get_object_or_404(Course, id=course_id)
-        if course not in teacher.courses.all():
+        if not teaches_course(teacher, course):
             return JsonResponse({
                 'error': 'You do not have permission to update enrollment deadline for this course'
             }, status=403)
@@ -259,7 +379,7 @@ def update_grade(request, enrollment_id):
         enrollment = get_object_or_404(Enrollment, id=enrollment_id)
 
         # Permission check
-        if enrollment.course not in teacher.courses.all():
+        if not teaches_course(teacher, enrollment.course_id):
             return JsonResponse({
                 'error': 'You do not have permission to update grades for this course'
             }, status=403)
@@ -302,16 +422,11 @@ def update_grade(request, enrollment_id):
 def my_courses(request, teacher_id):
     teacher = get_object_or_404(Teacher, id=teacher_id)
 
-    courses = teacher.courses.all().values(
-        'id', 'name', 'code', 'description', 'credits', 'created_at'
-    )
-
-    # Add student count for each course
-    courses_list = []
-    for course in courses:
-        student_count = Enrollment.objects.filter(course_id=course['id']).count()
-        course['student_count'] = student_count
-        courses_list.append(course)
+    # Student counts come from the stored Course.enrolled_count - no per-course COUNT
+    courses_list = list(teacher.courses.all().values(
+        'id', 'name', 'code', 'description', 'credits', 'created_at',
+        student_count=F('enrolled_count')
+    ))
 
     return JsonResponse({
         'teacher': f"{teacher.first_name} {teacher.last_name}",
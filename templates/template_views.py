@@ -6,27 +6,14 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from students.models import Student, Enrollment, EnrollmentRequest
 from teachers.models import Teacher
+from teachers.permissions import teaches_course
 from courses.models import Course
+from django.db.models import Count
 from django.utils import timezone
 from functools import wraps
+from students.services import enroll_student, CourseFullError, AlreadyEnrolledError
 from activity_logger import ActivityLogger
-
-
-def get_user_type(user):
-    """Determine user type: 'admin', 'teacher', or 'student'"""
-    if user.is_superuser:
-        return 'admin'
-    try:
-        Teacher.objects.get(user=user)
-        return 'teacher'
-    except Teacher.DoesNotExist:
-        pass
-    try:
-        Student.objects.get(user=user)
-        return 'student'
-    except Student.DoesNotExist:
-        pass
-    return None
+from user_roles import get_user_type, get_request_role
 
 
 def student_required(view_func):
@@ -34,7 +21,7 @@ def student_required(view_func):
     @wraps(view_func)
     @login_required
     def wrapper(request, *args, **kwargs):
-        user_type = get_user_type(request.user)
+        user_type = get_request_role(request).user_type
         if user_type == 'admin':
             # Admins have access to everything
             return view_func(request, *args, **kwargs)
@@ -51,7 +38,7 @@ def teacher_required(view_func):
     @wraps(view_func)
     @login_required
     def wrapper(request, *args, **kwargs):
-        user_type = get_user_type(request.user)
+        user_type = get_request_role(request).user_type
         if user_type == 'admin':
             # Admins have access to everything
             return view_func(request, *args, **kwargs)
@@ -285,9 +272,9 @@ def student_dashboard_view(request):
             messages.error(request, 'Student profile not found')
             return redirect('/')
 
-    enrollments = Enrollment.objects.filter(student=student).select_related('course', 'enrolled_by')
-    requests = EnrollmentRequest.objects.filter(student=student).select_related('course', 'reviewed_by')
-    pending_requests = requests.filter(status='pending').count()
+    enrollments = list(Enrollment.objects.filter(student=student).select_related('course', 'enrolled_by'))
+    requests = list(EnrollmentRequest.objects.filter(student=student).select_related('course', 'reviewed_by'))
+    pending_requests = sum(1 for enrollment_request in requests if enrollment_request.status == 'pending')
 
     return render(request, 'student_dashboard.html', {
         'student': student,
@@ -319,22 +306,22 @@ def teacher_dashboard_view(request):
             messages.error(request, 'Teacher profile not found')
             return redirect('/')
 
-    courses = teacher.courses.all()
+    courses = list(teacher.courses.all())
 
     # Get all pending requests for teacher's courses
-    pending_requests = EnrollmentRequest.objects.filter(
+    pending_requests = list(EnrollmentRequest.objects.filter(
         course__in=courses,
         status__in=['pending', 'waitlisted']
-    ).select_related('student', 'course')
+    ).select_related('student', 'course'))
 
-    # Calculate total students
-    total_students = Enrollment.objects.filter(course__in=courses).count()
+    # Seat counts and GPAs are stored, so the page needs no per-row queries
+    total_students = sum(course.enrolled_count for course in courses)
 
     return render(request, 'teacher_dashboard.html', {
         'teacher': teacher,
         'courses': courses,
         'pending_requests': pending_requests,
-        'pending_count': pending_requests.count(),
+        'pending_count': len(pending_requests),
         'total_students': total_students
     })
 
@@ -357,7 +344,7 @@ def approve_request_view(request, request_id):
 
             # Verify teacher teaches this course (skip for admin)
             if not request.user.is_superuser:
-                if not enrollment_request.course.teachers.filter(id=teacher.id).exists():
+                if not teaches_course(teacher, enrollment_request.course_id):
                     messages.error(request, 'You are not assigned to this course')
                     return redirect('/teacher-dashboard/')
 
@@ -404,7 +391,7 @@ def reject_request_view(request, request_id):
 
             # Verify teacher teaches this course (skip for admin)
             if not request.user.is_superuser:
-                if not enrollment_request.course.teachers.filter(id=teacher.id).exists():
+                if not teaches_course(teacher, enrollment_request.course_id):
                     messages.error(request, 'You are not assigned to this course')
                     return redirect('/teacher-dashboard/')
 
@@ -443,11 +430,11 @@ def teacher_course_students_view(request, course_id):
 
         # Verify teacher teaches this course (skip for admin)
         if not request.user.is_superuser and teacher:
-            if not course.teachers.filter(id=teacher.id).exists():
+            if not teaches_course(teacher, course):
                 messages.error(request, 'You are not assigned to this course')
                 return redirect('/teacher-dashboard/')
 
-        students = Enrollment.objects.filter(course=course).select_related('student', 'enrolled_by')
+        students = Enrollment.objects.filter(course=course).select_related('student__user', 'enrolled_by')
 
         return render(request, 'teacher_course_students.html', {
             'course': course,
@@ -474,7 +461,7 @@ def update_grade_view(request, enrollment_id):
 
             # Verify teacher teaches this course (skip for admin)
             if not request.user.is_superuser and teacher:
-                if not enrollment.course.teachers.filter(id=teacher.id).exists():
+                if not teaches_course(teacher, enrollment.course_id):
                     messages.error(request, 'You are not assigned to this course')
                     return redirect('/teacher-dashboard/')
 
@@ -515,7 +502,7 @@ def update_grade_view(request, enrollment_id):
 
 def students_list_view(request):
     """List all students"""
-    students = Student.objects.all().select_related('user')
+    students = Student.objects.with_gpa().select_related('user')
     return render(request, 'students_list.html', {'students': students})
 
 
@@ -532,7 +519,7 @@ def student_detail_view(request, student_id):
 
 def teachers_list_view(request):
     """List all teachers"""
-    teachers = Teacher.objects.all().select_related('user')
+    teachers = Teacher.objects.all().select_related('user').annotate(course_count=Count('courses'))
     return render(request, 'teachers_list.html', {'teachers': teachers})
 
 
@@ -548,7 +535,7 @@ def direct_enroll_view(request, course_id):
 
     # Verify teacher teaches this course (skip for admin)
     if not request.user.is_superuser and teacher:
-        if not course.teachers.filter(id=teacher.id).exists():
+        if not teaches_course(teacher, course):
             messages.error(request, 'You are not assigned to this course')
             return redirect('/teacher-dashboard/')
 
@@ -557,23 +544,16 @@ def direct_enroll_view(request, course_id):
             student_id = request.POST.get('student_id')
             student = get_object_or_404(Student, id=student_id)
 
-            # Check if course is full
-            if course.is_full:
+            # Create enrollment (locks the course row for the capacity check)
+            try:
+                enroll_student(student, course, enrolled_by=teacher,
+                               enrollment_deadline=course.enrollment_deadline)
+            except CourseFullError:
                 messages.error(request, f'Cannot enroll - course is full ({course.enrolled_count}/{course.openings})')
                 return redirect('/teacher-course-students/' + str(course_id) + '/')
-
-            # Check if already enrolled
-            if Enrollment.objects.filter(student=student, course=course).exists():
+            except AlreadyEnrolledError:
                 messages.error(request, f'{student.first_name} {student.last_name} is already enrolled')
                 return redirect('/teacher-course-students/' + str(course_id) + '/')
-
-            # Create enrollment
-            enrollment = Enrollment.objects.create(
-                student=student,
-                course=course,
-                enrolled_by=teacher,
-                enrollment_deadline=course.enrollment_deadline
-            )
             
             # Log direct enrollment
             ActivityLogger.log_enrollment(student, course, teacher, "direct_enroll")
@@ -606,7 +586,7 @@ def update_deadline_view(request, course_id):
 
     # Verify teacher teaches this course (skip for admin)
     if not request.user.is_superuser and teacher:
-        if not course.teachers.filter(id=teacher.id).exists():
+        if not teaches_course(teacher, course):
             messages.error(request, 'You are not assigned to this course')
             return redirect('/teacher-dashboard/')
 
@@ -661,16 +641,16 @@ def manage_course_view(request, course_id):
 
     # Verify teacher teaches this course (skip for admin)
     if not request.user.is_superuser and teacher:
-        if not course.teachers.filter(id=teacher.id).exists():
+        if not teaches_course(teacher, course):
             messages.error(request, 'You are not assigned to this course')
             return redirect('/teacher-dashboard/')
 
     # Get course statistics
-    enrollments = Enrollment.objects.filter(course=course).select_related('student')
+    enrollments = Enrollment.objects.filter(course=course).select_related('student__user')
     pending_requests = EnrollmentRequest.objects.filter(
         course=course,
         status__in=['pending', 'waitlisted']
-    ).select_related('student')
+    ).select_related('student__user')
 
     # Get all students not enrolled
     enrolled_student_ids = enrollments.values_list('student_id', flat=True)
@@ -0,0 +1,137 @@
+# User role resolution shared by views, decorators, the context processor and activity logging
+import time
+from collections import namedtuple
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+
+UserRole = namedtuple('UserRole', ['user_type', 'profile_id', 'is_teacher', 'is_student'])
+
+NO_ROLE = UserRole(None, None, False, False)
+PROFILE_FIELDS = ('teacher_profile', 'student_profile')
+ROLE_SESSION_KEY = '_user_role'
+ROLE_CHANGED_CACHE_KEY = 'user_role_changed:{}'
+# Backends whose entries only the current process sees (or nobody, for the dummy cache)
+PROCESS_LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def cache_is_shared():
+    """Does every worker see the default cache? Invalidation through it relies on that"""
+    return settings.CACHES['default']['BACKEND'] not in PROCESS_LOCAL_CACHE_BACKENDS
+
+
+def get_user_role(user):
+    """
+    Resolve user type and profile id with at most one query, memoized on the user
+
+    request.user is the same object for the whole request, so every caller after the
+    first is free. The profiles are also primed on the user, which makes later
+    user.teacher_profile / user.student_profile lookups query-free as well.
+    """
+    if user is None or not user.is_authenticated:
+        return NO_ROLE
+
+    role = getattr(user, '_role_cache', None)
+    if role is not None:
+        return role
+
+    fields = [User._meta.get_field(name) for name in PROFILE_FIELDS]
+    if not all(field.is_cached(user) for field in fields):
+        loaded = User.objects.select_related(*PROFILE_FIELDS).filter(pk=user.pk).first()
+        for field in fields:
+            field.set_cached_value(user, field.get_cached_value(loaded, default=None) if loaded else None)
+
+    teacher, student = (field.get_cached_value(user) for field in fields)
+    if user.is_superuser:
+        user_type, profile = 'admin', teacher or student
+    elif teacher is not None:
+        user_type, profile = 'teacher', teacher
+    elif student is not None:
+        user_type, profile = 'student', student
+    else:
+        user_type, profile = None, None
+
+    role = UserRole(user_type, profile.id if profile else None, teacher is not None, student is not None)
+    user._role_cache = role
+    return role
+
+
+def get_user_type(user):
+    """Determine user type: 'admin', 'teacher', 'student' or None"""
+    return get_user_role(user).user_type
+
+
+def role_claims(role):
+    """Role as the claims stored in JWTs and the session; role_at dates them for invalidation"""
+    return {
+        'user_type': role.user_type,
+        'profile_id': role.profile_id,
+        'role_at': time.time(),
+    }
+
+
+def role_from_claims(user_id, claims):
+    """
+    UserRole from JWT/session claims, or None if they are missing or predate a profile change
+
+    Changes are recorded in the default cache, so with a per-process cache another worker's
+    change would go unseen - claims are then never trusted and the role comes from the database.
+    """
+    if not claims or 'role_at' not in claims or 'user_type' not in claims or not cache_is_shared():
+        return None
+
+    changed_at = cache.get(ROLE_CHANGED_CACHE_KEY.format(user_id))
+    if changed_at is not None and changed_at >= claims['role_at']:
+        return None
+
+    user_type = claims['user_type']
+    return UserRole(user_type, claims.get('profile_id'), user_type == 'teacher', user_type == 'student')
+
+
+def prime_user_role(user, claims):
+    """Trust fresh claims for this user's role; returns False if they can't be used"""
+    role = role_from_claims(user.pk, claims)
+    # The superuser flag is already on the user, so a claim it contradicts costs nothing to reject
+    if role is None or (role.user_type == 'admin') != bool(user.is_superuser):
+        return False
+    user._role_cache = role
+    return True
+
+
+def get_request_role(request):
+    """
+    Role of request.user, taken from the session when it was recorded there
+
+    Template views and session-authenticated API calls resolve their role with no
+    queries after the first request of a session.
+    """
+    user = request.user
+    if not user.is_authenticated or getattr(user, '_role_cache', None) is not None:
+        return get_user_role(user)
+
+    session = getattr(request, 'session', None)
+    if session is None:
+        return get_user_role(user)
+    if prime_user_role(user, session.get(ROLE_SESSION_KEY)):
+        return user._role_cache
+
+    role = get_user_role(user)
+    session[ROLE_SESSION_KEY] = role_claims(role)
+    return role
+
+
+def invalidate_user_role(user_id, user=None):
+    """Mark role claims issued before now as stale - called when a profile or admin flag changes"""
+    lifetime = settings.SIMPLE_JWT['REFRESH_TOKEN_LIFETIME'].total_seconds()
+    cache.set(ROLE_CHANGED_CACHE_KEY.format(user_id), time.time(), timeout=lifetime)
+    if user is not None:
+        user.__dict__.pop('_role_cache', None)
+
+
+def remember_user_role(request, user):
+    """Record the role in the session at login so later requests skip the lookup"""
+    if request is not None and hasattr(request, 'session'):
+        request.session[ROLE_SESSION_KEY] = role_claims(get_user_role(user))